@@ -0,0 +1,86 @@
+#!/usr/bin/python
+from CProfiler import profiler
+
+import re
+import subprocess
+
+
+# Keeps one exiftool process running for all images instead of starting a new
+# one (and a new Perl interpreter) for each image. Use it in a with statement
+# so the process is always stopped, also when something goes wrong.
+class CExifTool:
+    def __init__(self):
+        self.process = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.stop()
+        return False
+
+    def start(self):
+        # Arguments are read from stdin, one per line, until '-execute'. File
+        # names are passed as UTF-8 so special characters survive on Windows
+        try:
+            with profiler.measure('exiftool (start)'):
+                self.process = subprocess.Popen(["exiftool",
+                                                 "-stay_open", "True",
+                                                 "-@", "-",
+                                                 "-common_args",
+                                                 "-charset", "filename=utf8"],
+                                                stdin=subprocess.PIPE,
+                                                stdout=subprocess.PIPE,
+                                                stderr=subprocess.STDOUT)
+        except OSError:
+            self.process = None
+            return 1
+        return 0
+
+    def execute(self, *args):
+        # Run one command and return its output, or None if exiftool has gone
+        with profiler.measure('exiftool'):
+            return self.executeCommand(args)
+
+    def executeCommand(self, args):
+        if self.process is None or self.process.poll() is not None:
+            return None
+        try:
+            self.process.stdin.write(("\n".join(args) + "\n-execute\n").encode('utf-8'))
+            self.process.stdin.flush()
+        except OSError:
+            return None
+
+        # exiftool writes '{ready}' once it has finished the command
+        output = []
+        for line in self.process.stdout:
+            line = line.decode('utf-8', errors='ignore').rstrip()
+            if line == "{ready}":
+                return "\n".join(output)
+            output.append(line)
+        return None
+
+    def removeGps(self, path):
+        out = self.execute("-gpsaltitude=",
+                           "-gpslatitude=",
+                           "-gpslongitude=",
+                           "-overwrite_original",
+                           path)
+        if out is None:
+            return 1
+        # An image without GPS data is reported as unchanged which is fine too
+        if re.search(r'\b1 image files? (updated|unchanged)', out):
+            return 0
+        return 1
+
+    def stop(self):
+        if self.process is None:
+            return 0
+        try:
+            self.process.stdin.write(b"-stay_open\nFalse\n")
+            self.process.stdin.flush()
+        except OSError:
+            pass
+        self.process.communicate()
+        self.process = None
+        return 0
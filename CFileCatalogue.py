@@ -0,0 +1,76 @@
+#!/usr/bin/python
+import gzip
+import json
+import os
+
+
+# Catalogue of the files in a set of directories. Directories whose
+# modification time hasn't changed since the last scan aren't listed again.
+# When a directory is listed, all its files are stat'ed again so files
+# overwritten under the same name are picked up. Overwriting a file in place
+# doesn't change the modification time of its directory though, so such a
+# file is only picked up when rescan is set, which lists every directory
+# again. Without a path it's just a one-off inventory of the directories
+# scanned.
+class CFileCatalogue:
+    def __init__(self, path=None, rescan=False):
+        self.path = path
+        self.rescan = rescan
+        self.changed = False
+        # Directory -> {'mtime': mtime, 'files': {file name: [size, mtime]}}
+        self.directories = {}
+
+    def load(self):
+        if not self.path or not os.path.isfile(self.path):
+            return 0
+        try:
+            with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+                self.directories = json.load(f)
+        except (OSError, ValueError, EOFError):
+            # Start again with an empty catalogue
+            self.directories = {}
+        return 0
+
+    def save(self):
+        if not self.path or not self.changed:
+            return 0
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with gzip.open(self.path + '.tmp', 'wt', encoding='utf-8') as f:
+                json.dump(self.directories, f, separators=(',', ':'))
+            os.replace(self.path + '.tmp', self.path)
+        except OSError:
+            return 1
+        self.changed = False
+        return 0
+
+    def listDirectories(self, dirPath):
+        # Names of the subdirectories of the given directory
+        with os.scandir(dirPath) as entries:
+            return [entry.name for entry in entries if entry.is_dir()]
+
+    def listFiles(self, dirPath):
+        # Names of the files in the given directory, without stat'ing them
+        with os.scandir(dirPath) as entries:
+            return [entry.name for entry in entries if entry.is_file()]
+
+    def scanDirectory(self, dirPath):
+        # Return {file name: [size, mtime]} for all files in the directory
+        mtime = os.stat(dirPath).st_mtime
+        cached = self.directories.get(dirPath)
+        if cached and cached['mtime'] == mtime and not self.rescan:
+            return cached['files']
+
+        # On Windows scandir already has the size and mtime, so stat'ing
+        # every file costs nothing extra
+        files = {}
+        with os.scandir(dirPath) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+                files[entry.name] = [stat.st_size, stat.st_mtime]
+
+        self.directories[dirPath] = {'mtime': mtime, 'files': files}
+        self.changed = True
+        return files
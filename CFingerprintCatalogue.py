@@ -0,0 +1,170 @@
+#!/usr/bin/python
+from CProfiler import profiler
+
+import concurrent.futures
+import hashlib
+import json
+import os
+import subprocess
+
+
+def hammingDistance(hash1, hash2):
+    return bin(hash1 ^ hash2).count('1')
+
+
+# BK-tree on the Hamming distance between perceptual hashes. Finds all hashes
+# within a given distance without comparing against every single one.
+class CBKTree:
+    def __init__(self):
+        # Each node is [hash, items with that hash, {distance: child node}]
+        self.root = None
+
+    def add(self, value, item):
+        if self.root is None:
+            self.root = [value, [item], {}]
+            return
+        node = self.root
+        while True:
+            distance = hammingDistance(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            if distance not in node[2]:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = node[2][distance]
+
+    def find(self, value, maxDistance):
+        # Return (distance, item) for everything within maxDistance
+        found = []
+        if self.root is None:
+            return found
+        nodes = [self.root]
+        while nodes:
+            node = nodes.pop()
+            distance = hammingDistance(value, node[0])
+            if distance <= maxDistance:
+                found.extend((distance, item) for item in node[1])
+            # Triangle inequality: only these children can be close enough
+            for childDistance, child in node[2].items():
+                if distance - maxDistance <= childDistance <= distance + maxDistance:
+                    nodes.append(child)
+        found.sort()
+        return found
+
+
+# Persistent catalogue of the content hash (md5) and perceptual hash of every
+# image in the library. Only images that are new or changed since the last run,
+# or couldn't be hashed then, get hashed again.
+class CFingerprintCatalogue:
+    def __init__(self, path, workers=None):
+        self.path = path
+        self.workers = workers
+        # Image path -> [size, mtime, md5, perceptual hash]
+        self.entries = {}
+        self.md5Index = {}
+        self.hashTree = CBKTree()
+
+    def load(self):
+        if not os.path.isfile(self.path):
+            return 0
+        try:
+            with open(self.path, 'r') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            # Start again with an empty catalogue
+            self.entries = {}
+        return 0
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path + '.tmp', 'w') as f:
+                json.dump(self.entries, f, separators=(',', ':'))
+            os.replace(self.path + '.tmp', self.path)
+        except OSError:
+            return 1
+        return 0
+
+    def fingerprint(self, path):
+        # Content hash
+        md5 = hashlib.md5()
+        try:
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1024*1024), b''):
+                    md5.update(block)
+        except OSError:
+            return None, None
+
+        # Perceptual hash (dHash): shrink to 9x8 grey pixels and compare each
+        # pixel with its right neighbour. Small edits, resizing and
+        # recompression hardly change the hash.
+        perceptualHash = None
+        try:
+            with profiler.measure('magick (fingerprint)'):
+                out = subprocess.Popen(["magick",
+                                        "-define", "jpeg:size=64x64",
+                                        path,
+                                        "-auto-orient",
+                                        "-colorspace", "gray",
+                                        "-resize", "9x8!",
+                                        "-depth", "8",
+                                        "gray:-"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+                pixels = out.communicate()[0]
+            if out.returncode == 0 and len(pixels) == 72:
+                perceptualHash = 0
+                for row in range(8):
+                    for column in range(8):
+                        perceptualHash <<= 1
+                        if pixels[row*9+column] > pixels[row*9+column+1]:
+                            perceptualHash |= 1
+        except OSError:
+            pass
+
+        return md5.hexdigest(), perceptualHash
+
+    def update(self, files):
+        # Bring the catalogue in line with the given {image: (size, mtime)},
+        # only hashing the ones that are new, have changed or failed before.
+        # The sizes and mtimes come from the library catalogue so the images
+        # don't need to be stat'ed again.
+        entries = {}
+        toHash = []
+        for path, (size, mtime) in files.items():
+            entry = self.entries.get(path)
+            if (entry and entry[0] == size and entry[1] == mtime and
+                entry[2] is not None and entry[3] is not None):
+                entries[path] = entry
+            else:
+                entries[path] = [size, mtime, None, None]
+                toHash.append(path)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for path, (md5, perceptualHash) in zip(toHash, executor.map(self.fingerprint, toHash)):
+                entries[path][2] = md5
+                entries[path][3] = perceptualHash
+
+        self.entries = entries
+        self.createIndex()
+        return len(toHash)
+
+    def createIndex(self):
+        self.md5Index = {}
+        self.hashTree = CBKTree()
+        for path, (size, mtime, md5, perceptualHash) in self.entries.items():
+            if md5 is not None:
+                self.md5Index.setdefault(md5, []).append(path)
+            if perceptualHash is not None:
+                self.hashTree.add(perceptualHash, path)
+
+    def findDuplicates(self, md5, perceptualHash, maxDistance):
+        # Return the images with identical content and the (distance, image)
+        # of images that look alike
+        identical = []
+        if md5 is not None:
+            identical = self.md5Index.get(md5, [])
+        similar = []
+        if perceptualHash is not None:
+            similar = [(distance, path) for distance, path in self.hashTree.find(perceptualHash, maxDistance)
+                       if path not in identical]
+        return identical, similar
@@ -0,0 +1,179 @@
+#!/usr/bin/python
+import io
+import os
+import struct
+
+
+# Reads the image dimensions and the most useful exif tags straight from the
+# headers of a JPEG, PNG or TIFF file without decoding the image itself
+class CImageHeader:
+    # Start of frame markers holding the image dimensions. C4 (DHT), C8 (JPG)
+    # and CC (DAC) use the same range but aren't frames
+    JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+    # TIFF tags
+    TAG_IMAGEWIDTH = 256
+    TAG_IMAGELENGTH = 257
+    TAG_MAKE = 271
+    TAG_MODEL = 272
+    TAG_ORIENTATION = 274
+    TAG_EXIFIFD = 34665
+    TAG_EXPOSURETIME = 33434
+    TAG_FNUMBER = 33437
+    TAG_ISO = 34855
+    TAG_DATETIMEORIGINAL = 36867
+
+    # TIFF field types: (struct format, size in bytes)
+    TIFF_TYPES = {1: ('B', 1), 2: ('s', 1), 3: ('H', 2), 4: ('L', 4),
+                  5: ('LL', 8), 6: ('b', 1), 7: ('s', 1), 8: ('h', 2),
+                  9: ('l', 4), 10: ('ll', 8)}
+
+    def __init__(self, path):
+        self.path = path
+
+        # To be filled in by read()
+        self.format = None
+        self.size = None
+        self.width = None
+        self.height = None
+        self.orientation = None
+        self.fstop = None
+        self.exposure = None
+        self.ISO = None
+        self.make = None
+        self.model = None
+        self.dateTimeOriginal = None
+
+    def read(self):
+        try:
+            with open(self.path, 'rb') as f:
+                self.size = os.fstat(f.fileno()).st_size
+                signature = f.read(8)
+                f.seek(0)
+                if signature.startswith(b'\xff\xd8'):
+                    self.format = 'JPEG'
+                    ret = self.readJpeg(f)
+                elif signature == b'\x89PNG\r\n\x1a\n':
+                    self.format = 'PNG'
+                    ret = self.readPng(f)
+                elif signature[:4] in (b'II*\x00', b'MM\x00*'):
+                    self.format = 'TIFF'
+                    ret = self.readTiff(f, True)
+                else:
+                    return 1
+        except (OSError, struct.error, ValueError, TypeError):
+            return 1
+
+        if ret or not self.width or not self.height:
+            return 1
+        return 0
+
+    def readJpeg(self, f):
+        f.seek(2)
+        while True:
+            # Markers can be preceded by any number of 0xFF fill bytes
+            byte = f.read(1)
+            if byte != b'\xff':
+                return 1
+            while byte == b'\xff':
+                byte = f.read(1)
+            if not byte:
+                return 1
+            marker = byte[0]
+            # Markers without a segment
+            if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+                continue
+            # Start of scan or end of image: no more headers to come
+            if marker in (0xD9, 0xDA):
+                return 1
+            length = struct.unpack('>H', f.read(2))[0]
+            # The length includes its own two bytes, anything less means the
+            # header is corrupt
+            if length < 2:
+                return 1
+            if marker in self.JPEG_SOF_MARKERS:
+                self.height, self.width = struct.unpack('>xHH', f.read(5))
+                return 0
+            segment = f.read(length - 2)
+            # APP1 segment with the exif data, stored as a small TIFF file
+            if marker == 0xE1 and segment.startswith(b'Exif\x00\x00'):
+                self.readTiff(io.BytesIO(segment[6:]), False)
+
+    def readPng(self, f):
+        # The IHDR chunk always comes first
+        length, chunkType, width, height = struct.unpack('>8xL4sLL', f.read(24))
+        if chunkType != b'IHDR':
+            return 1
+        self.width = width
+        self.height = height
+        return 0
+
+    def readTiff(self, f, dimensions):
+        byteOrder = '<' if f.read(2) == b'II' else '>'
+        magic, ifdOffset = struct.unpack(byteOrder+'HL', f.read(6))
+        if magic != 42:
+            return 1
+
+        # IFD0 contains the main image and a pointer to the exif IFD
+        tags = self.readIfd(f, byteOrder, ifdOffset)
+        if dimensions:
+            self.width = tags.get(self.TAG_IMAGEWIDTH)
+            self.height = tags.get(self.TAG_IMAGELENGTH)
+        self.orientation = tags.get(self.TAG_ORIENTATION)
+        self.make = tags.get(self.TAG_MAKE)
+        self.model = tags.get(self.TAG_MODEL)
+
+        if self.TAG_EXIFIFD in tags:
+            exifTags = self.readIfd(f, byteOrder, tags[self.TAG_EXIFIFD])
+            fnumber = self.getRational(exifTags.get(self.TAG_FNUMBER))
+            if fnumber:
+                self.fstop = round(fnumber, 1)
+            exposure = self.getRational(exifTags.get(self.TAG_EXPOSURETIME))
+            if exposure:
+                if exposure < 1:
+                    self.exposure = f"1/{round(1 / exposure)}"
+                else:
+                    self.exposure = f"{exposure:g}"
+            self.ISO = exifTags.get(self.TAG_ISO)
+            self.dateTimeOriginal = exifTags.get(self.TAG_DATETIMEORIGINAL)
+
+        return 0
+
+    def getRational(self, value):
+        # Rationals are (numerator, denominator) but some software writes
+        # plain numbers instead
+        if isinstance(value, tuple):
+            if not value[1]:
+                return None
+            return value[0] / value[1]
+        if isinstance(value, (int, float)):
+            return value
+        return None
+
+    def readIfd(self, f, byteOrder, offset):
+        # Only the first value of each tag is kept, which is all we need
+        tags = {}
+        f.seek(offset)
+        numEntries = struct.unpack(byteOrder+'H', f.read(2))[0]
+        entries = f.read(12 * numEntries)
+        for entry in range(numEntries):
+            tag, fieldType, count = struct.unpack(byteOrder+'HHL', entries[12*entry:12*entry+8])
+            valueData = entries[12*entry+8:12*entry+12]
+            if fieldType not in self.TIFF_TYPES:
+                continue
+            valueFormat, valueSize = self.TIFF_TYPES[fieldType]
+            # Values larger than 4 bytes are stored elsewhere in the file
+            if count * valueSize > 4:
+                valueOffset = struct.unpack(byteOrder+'L', valueData)[0]
+                position = f.tell()
+                f.seek(valueOffset)
+                valueData = f.read(count * valueSize if valueFormat == 's' else valueSize)
+                f.seek(position)
+            if valueFormat == 's':
+                value = valueData[:count].split(b'\x00')[0].decode(errors='ignore').strip()
+            elif len(valueFormat) == 2:
+                value = struct.unpack(byteOrder+valueFormat, valueData[:valueSize])
+            else:
+                value = struct.unpack(byteOrder+valueFormat, valueData[:valueSize])[0]
+            tags[tag] = value
+        return tags
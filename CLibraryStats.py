@@ -0,0 +1,140 @@
+#!/usr/bin/python
+import csv
+import json
+import re
+
+
+# Statistics of the HPS plants library, worked out in a single pass over the
+# columns of the Plants sheet: the overall numbers of genera, taxa and images,
+# what has been added since a given HPS number, and the number of images per
+# donor, per year added and per genus. Withdrawn images aren't counted.
+class CLibraryStats:
+    # Donors which aren't counted as contributors, besides the ones left empty
+    ANONYMOUS_DONORS = ('Anonymous', 'Unknown')
+
+    def __init__(self, startCount):
+        self.startCount = startCount
+        self.numImages = 0
+        self.numNewImages = 0
+        self.numNewTaxa = 0
+        self.foundStartCount = False
+        # RHS numbers and genera seen so far
+        self.taxa = set()
+        self.genera = set()
+        self.addedGenera = set()
+        self.donors = set()
+        self.imagesPerDonor = {}
+        self.imagesPerYear = {}
+        self.imagesPerGenus = {}
+
+    def compute(self, names, numbers, rhsNumbers, donors, datesAdded, datesWithdrawn):
+        # Each argument is a column of the Plants sheet: Plant name, Number,
+        # RHS no, Donor, Date added, Date withdrawn
+        for name, number, rhsNumber, donor, dateAdded, dateWithdrawn in zip(names, numbers, rhsNumbers, donors, datesAdded, datesWithdrawn):
+            # Ignore the withdrawn images
+            if not rhsNumber: continue
+            if rhsNumber == 'WITHDRAWN': continue
+            if dateWithdrawn: continue
+
+            words = str(name).split(None, 1) if name else []
+            if not words: continue
+            genus = words[0]
+
+            self.numImages += 1
+            donorName = donor or 'Unknown'
+            year = self.getYear(dateAdded)
+            self.imagesPerDonor[donorName] = self.imagesPerDonor.get(donorName, 0) + 1
+            self.imagesPerYear[year] = self.imagesPerYear.get(year, 0) + 1
+            self.imagesPerGenus[genus] = self.imagesPerGenus.get(genus, 0) + 1
+
+            # Find the point from where we want to start counting
+            if number == self.startCount:
+                self.foundStartCount = True
+
+            if self.foundStartCount:
+                if rhsNumber not in self.taxa:
+                    self.numNewTaxa += 1
+                if donor and donor not in self.ANONYMOUS_DONORS:
+                    self.donors.add(donor)
+                if genus not in self.genera:
+                    self.addedGenera.add(genus)
+                self.numNewImages += 1
+
+            self.genera.add(genus)
+            self.taxa.add(rhsNumber)
+        return 0
+
+    def getYear(self, date):
+        # Dates are either real dates or text like '07/11/2019'
+        if hasattr(date, 'year'):
+            return str(date.year)
+        match = re.search(r'(\d{4})\s*$', str(date)) if date else None
+        if match:
+            return match.group(1)
+        return 'Unknown'
+
+    def printSummary(self):
+        print()
+        print( "  * Overall in HPS library, there are:")
+        print(f"    - {len(self.genera)} different genus")
+        print(f"    - {len(self.taxa)} different species")
+        print(f"    - {self.numImages} valid images")
+        print()
+        print(f"  * Since {self.startCount}:")
+        print(f"    - {self.formatIncrease(self.numNewTaxa, self.numImages-self.numNewTaxa)} new taxa have been added not previously in library")
+        print(f"    - {len(self.donors)} donors contributed")
+        if len(self.addedGenera):
+            print(f"    - {self.formatIncrease(len(self.addedGenera), len(self.genera)-len(self.addedGenera))} new genera have been added not previously in library: {self.addedGenera}")
+        else:
+            print("    - 0 new genus have been added not previously in library")
+        print(f"    - {self.formatIncrease(self.numNewImages, self.numImages-self.numNewImages)} images have been added")
+        return 0
+
+    def formatIncrease(self, count, previousCount):
+        # Count and what percentage that is of what was there before, only the
+        # count when counting from the first accession
+        if previousCount == 0:
+            return f"{count}"
+        return f"{count}/{count/previousCount*100.0:.1f}%"
+
+    def getResults(self):
+        return {'startCount':     self.startCount,
+                'genera':         len(self.genera),
+                'taxa':           len(self.taxa),
+                'images':         self.numImages,
+                'newTaxa':        self.numNewTaxa,
+                'newImages':      self.numNewImages,
+                'donors':         sorted(str(donor) for donor in self.donors),
+                'newGenera':      sorted(self.addedGenera),
+                'imagesPerDonor': dict(sorted(self.imagesPerDonor.items())),
+                'imagesPerYear':  dict(sorted(self.imagesPerYear.items())),
+                'imagesPerGenus': dict(sorted(self.imagesPerGenus.items()))}
+
+    def saveJson(self, path):
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(self.getResults(), f, indent=2, ensure_ascii=False)
+        except OSError:
+            print(f"! Couldn't write stats to '{path}'")
+            return 1
+        return 0
+
+    def saveCsv(self, path):
+        # One value per line as (statistic, key, value) so it can be charted
+        # directly, keys are empty for the overall numbers
+        results = self.getResults()
+        try:
+            with open(path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(['statistic', 'key', 'value'])
+                for statistic in ('startCount', 'genera', 'taxa', 'images', 'newTaxa', 'newImages'):
+                    writer.writerow([statistic, '', results[statistic]])
+                writer.writerow(['donors', '', len(results['donors'])])
+                writer.writerow(['newGenera', '', len(results['newGenera'])])
+                for statistic in ('imagesPerDonor', 'imagesPerYear', 'imagesPerGenus'):
+                    for key, value in results[statistic].items():
+                        writer.writerow([statistic, key, value])
+        except OSError:
+            print(f"! Couldn't write stats to '{path}'")
+            return 1
+        return 0
@@ -0,0 +1,57 @@
+#!/usr/bin/python
+from array import array
+
+
+# Inverted n-gram index over a list of names. Answers 'which names contain
+# this substring' without having to compare against every single name.
+class CNameIndex:
+    NGRAM = 3
+
+    def __init__(self, normalise=None):
+        # Optional function applied to both the indexed names and the names
+        # searched for (e.g. lower case, remove spaces/special characters)
+        self.normalise = normalise
+        self.keys = []
+        self.names = []
+        # Each n-gram maps to the (increasing) positions of the names it
+        # appears in
+        self.postings = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, key, name):
+        if self.normalise:
+            name = self.normalise(name)
+        position = len(self.names)
+        self.keys.append(key)
+        self.names.append(name)
+        for start in range(len(name) - self.NGRAM + 1):
+            posting = self.postings.get(name[start:start+self.NGRAM])
+            if posting is None:
+                posting = array('I')
+                self.postings[name[start:start+self.NGRAM]] = posting
+            if not posting or posting[-1] != position:
+                posting.append(position)
+
+    def find(self, name):
+        # Return the keys of all names containing the given name, in the order
+        # they were added
+        if self.normalise:
+            name = self.normalise(name)
+
+        if len(name) < self.NGRAM:
+            # Too short to use the index, check every name
+            candidates = range(len(self.names))
+        else:
+            # Every match has to contain all n-grams of the name so only check
+            # the names of the rarest one
+            candidates = None
+            for start in range(len(name) - self.NGRAM + 1):
+                posting = self.postings.get(name[start:start+self.NGRAM])
+                if posting is None:
+                    return []
+                if candidates is None or len(posting) < len(candidates):
+                    candidates = posting
+
+        return [self.keys[position] for position in candidates if name in self.names[position]]
@@ -0,0 +1,117 @@
+#!/usr/bin/python
+import contextlib
+import json
+import threading
+import time
+
+
+# Records where the time goes during a run: wall and CPU time of each stage,
+# and how often and how long external tools, spreadsheet loads/saves and
+# prompts took. Time waiting for the operator at a prompt is kept separately
+# so it can be told apart from the time the machine needed. Does nothing
+# unless enabled.
+class CProfiler:
+    def __init__(self):
+        self.enabled = False
+        self.reset()
+
+    def reset(self):
+        # Activities are recorded from multiple threads at the same time
+        self.lock = threading.Lock()
+        # [name, wall time, CPU time, time waiting for input]
+        self.stages = []
+        # Activity -> [count, time]
+        self.activities = {}
+        self.inputTime = 0.0
+
+    def add(self, activity, seconds, count=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            entry = self.activities.setdefault(activity, [0, 0.0])
+            entry[0] += count
+            entry[1] += seconds
+
+    @contextlib.contextmanager
+    def measure(self, activity):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(activity, time.perf_counter() - start)
+
+    def run(self, stage, function, *args):
+        # Run one stage of the script and return what it returned
+        if not self.enabled:
+            return function(*args)
+        startWall = time.perf_counter()
+        startCpu = time.process_time()
+        startInput = self.inputTime
+        try:
+            return function(*args)
+        finally:
+            self.stages.append([stage,
+                                time.perf_counter() - startWall,
+                                time.process_time() - startCpu,
+                                self.inputTime - startInput])
+
+    def input(self, prompt=''):
+        # Replacement for input() which keeps track of the time the operator
+        # needed to answer
+        start = time.perf_counter()
+        try:
+            return input(prompt)
+        finally:
+            if self.enabled:
+                seconds = time.perf_counter() - start
+                self.inputTime += seconds
+                self.add('input', seconds)
+
+    def printSummary(self):
+        if not self.enabled:
+            return 0
+        print("Profile")
+        print("-------")
+        print(f"  {'Stage':<28} {'Wall (s)':>10} {'CPU (s)':>10} {'Input (s)':>10} {'Machine (s)':>12}")
+        totalWall = totalCpu = totalInput = 0.0
+        for name, wall, cpu, inputTime in self.stages:
+            print(f"  {name:<28} {wall:>10.2f} {cpu:>10.2f} {inputTime:>10.2f} {wall-inputTime:>12.2f}")
+            totalWall += wall
+            totalCpu += cpu
+            totalInput += inputTime
+        print(f"  {'Total':<28} {totalWall:>10.2f} {totalCpu:>10.2f} {totalInput:>10.2f} {totalWall-totalInput:>12.2f}")
+        print()
+        # Activities on multiple threads overlap so can add up to more than
+        # the wall time
+        print(f"  {'Activity':<48} {'Count':>8} {'Time (s)':>10}")
+        with self.lock:
+            activities = sorted(self.activities.items())
+        for name, (count, seconds) in activities:
+            print(f"  {name:<48} {count:>8} {seconds:>10.2f}")
+        print()
+        return 0
+
+    def getResults(self):
+        with self.lock:
+            activities = {name: {'count': count, 'time': seconds} for name, (count, seconds) in self.activities.items()}
+        return {'stages': [{'name': name, 'wall': wall, 'cpu': cpu, 'input': inputTime}
+                           for name, wall, cpu, inputTime in self.stages],
+                'activities': activities}
+
+    def save(self, path):
+        if not self.enabled:
+            return 0
+        try:
+            with open(path, 'w') as f:
+                json.dump(self.getResults(), f, indent=2)
+        except OSError:
+            print(f"! Couldn't write profile to '{path}'")
+            return 1
+        return 0
+
+
+# Shared by all modules, enabled with --profile
+profiler = CProfiler()
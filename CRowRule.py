@@ -0,0 +1,31 @@
+#!/usr/bin/python
+
+
+# A check done on every row of a sheet. check(rowIndex, row) returns what to
+# remember about a row which doesn't pass, or None if it's fine. Once all rows
+# have been seen, report(results) prints the outcome under the title.
+class CRowRule:
+    def __init__(self, title, check, report):
+        self.title = title
+        self.check = check
+        self.report = report
+        self.results = []
+
+    def apply(self, rowIndex, row):
+        result = self.check(rowIndex, row)
+        if result is not None:
+            self.results.append(result)
+
+    def printReport(self):
+        print(self.title)
+        self.report(self.results)
+
+
+def applyRowRules(rules, rows):
+    # Run all rules in a single pass over (row index, row) and print their
+    # reports in order
+    for rowIndex, row in rows:
+        for rule in rules:
+            rule.apply(rowIndex, row)
+    for rule in rules:
+        rule.printReport()
@@ -1,7 +1,15 @@
 #!/usr/bin/python
+from CProfiler import profiler
+from CTable import CTable
+
 import csv
+import hashlib
+import io
+import locale
 import os
+import pickle
 import sys
+import time
 
 # Module openpyxl needs to be imported separately
 try:
@@ -13,30 +21,129 @@ except ModuleNotFoundError:
 
 
 class CSpreadSheet:
-    def __init__(self, path):
+    # Increase when the layout of the snapshot changes
+    SNAPSHOT_VERSION = 1
+
+    def __init__(self, path, readOnly=False, columns=None, snapshotDir=None, writeSnapshot=True):
         self.path = path
         self.dirname = os.path.dirname(path)
         self.filename = os.path.basename(os.path.splitext(path)[0])
         self.extension = os.path.splitext(path)[1]
+        self.readOnly = readOnly
+        self.columns = columns
         self.workbook = None
+        # Time it took to load, kept with the spreadsheet so it's also known
+        # when it was loaded in another process
+        self.loadTime = 0.0
+        self.loadedFromSnapshot = False
+        start = time.perf_counter()
+
+        # Parsing the file takes time. Use the snapshot of the parsed data from
+        # an earlier run if the file hasn't changed since. Snapshots are kept
+        # in a local directory (none if not given) rather than next to the
+        # source on the shared drive, as loading one runs pickle. Only write
+        # one if writeSnapshot is set, so a dry run doesn't create any files.
+        self.snapshotPath = None
+        if snapshotDir:
+            # Each way of loading the file has its own snapshot, so scripts
+            # loading it differently don't overwrite each other's
+            loadMode = ''
+            if readOnly:
+                loadMode = '.ro'
+                if columns is not None:
+                    loadMode += '-' + '-'.join(str(column) for column in columns)
+            self.snapshotPath = snapshotDir + os.path.basename(self.path) + loadMode + '.snapshot'
+        self.sourceFingerprint = None
+        if self.snapshotPath and self.loadSnapshot() == 0:
+            self.loadedFromSnapshot = True
+            self.loadTime = time.perf_counter() - start
+            return
 
         # Load the file
-        if self.extension == ".xlsx":
+        if self.extension == ".xlsx" and readOnly:
+            # Stream through the rows without building the full workbook and
+            # only keep the header row and the requested columns (all if not
+            # specified). The workbook can't be saved.
+            workbook = load_workbook(filename=self.path, read_only=True)
+            self.workbook = {}
+            for sheet in workbook.worksheets:
+                table = CTable(sheet.title)
+                for index, row in enumerate(sheet.iter_rows(values_only=True)):
+                    if index == 0:
+                        table.appendRow(row)
+                    else:
+                        table.appendRow(row, columns)
+                self.workbook[sheet.title] = table
+            workbook.close()
+        elif self.extension == ".xlsx":
             self.workbook = load_workbook(filename=self.path)
         elif self.extension == ".csv":
-            # We only have one sheet in a csv file
+            # We only have one sheet in a csv file. Store it column by column
+            # in a lightweight table which behaves like an openpyxl sheet
             title = 'active'
-            # For uniformity, write into a xlxs workbook
-            self.workbook = openpyxl.Workbook()
-            self.workbook.create_sheet(title)
+            self.workbook = {title: CTable(title)}
             with open(self.path, 'r') as f:
                 reader = csv.reader(f, delimiter='\t')
-                for r, row in enumerate(reader):
-                    for c, value in enumerate(row):
-                        self.setValue(title, r+1, c+1, value)
+                for row in reader:
+                    self.workbook[title].appendRow(row)
         else:
             print(f"! Didn't recognise extension '{self.extension}'")
 
+        if self.snapshotPath and writeSnapshot and self.workbook is not None:
+            self.saveSnapshot()
+        self.loadTime = time.perf_counter() - start
+
+    def getSourceFingerprint(self):
+        # Size, modification time and hash of the source file
+        if self.sourceFingerprint is None:
+            stat = os.stat(self.path)
+            sha1 = hashlib.sha1()
+            with open(self.path, 'rb') as f:
+                for block in iter(lambda: f.read(1024*1024), b''):
+                    sha1.update(block)
+            self.sourceFingerprint = (stat.st_size, stat.st_mtime_ns, sha1.hexdigest())
+        return self.sourceFingerprint
+
+    def getSnapshotHeader(self):
+        return {'version':     self.SNAPSHOT_VERSION,
+                'readOnly':    self.readOnly,
+                'columns':     self.columns,
+                'fingerprint': self.getSourceFingerprint()}
+
+    def loadSnapshot(self):
+        # The snapshot is a small header pickle describing the source file
+        # followed by the pickled workbook
+        if not os.path.isfile(self.snapshotPath):
+            return 1
+        try:
+            with open(self.snapshotPath, 'rb') as f:
+                header = pickle.load(f)
+                # Check the cheap things first before hashing the source
+                stat = os.stat(self.path)
+                if (not isinstance(header, dict) or
+                    header.get('version') != self.SNAPSHOT_VERSION or
+                    header.get('fingerprint', (None, None))[:2] != (stat.st_size, stat.st_mtime_ns) or
+                    header != self.getSnapshotHeader()):
+                    return 1
+                self.workbook = pickle.load(f)
+        except Exception:
+            # It's only a cache, parse the file instead whatever went wrong
+            self.workbook = None
+            return 1
+        return 0
+
+    def saveSnapshot(self):
+        # Not being able to write a snapshot only means the next run is slower
+        try:
+            os.makedirs(os.path.dirname(self.snapshotPath), exist_ok=True)
+            with open(self.snapshotPath + '.tmp', 'wb') as f:
+                pickle.dump(self.getSnapshotHeader(), f, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump(self.workbook, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(self.snapshotPath + '.tmp', self.snapshotPath)
+        except (OSError, pickle.PicklingError):
+            return 1
+        return 0
+
     def validate(self, sheetName, headers):
         # Check if workbook and sheet have been created
         if sheetName not in self.workbook:
@@ -82,23 +189,98 @@ class CSpreadSheet:
 
     def getValue(self, sheetName, rowIndex, columnIndex):
         sheet = self.workbook[sheetName]
+        if isinstance(sheet, CTable):
+            return sheet.getValue(rowIndex, columnIndex)
         return sheet.cell(row=rowIndex, column=columnIndex).value
 
     def getColumn(self, sheetName, columnIndex):
-        values = []
+        # All values of a column, including the header
+        return self.getColumns(sheetName, [columnIndex], 1)[0]
+
+    def getColumns(self, sheetName, columns, minRow=2, maxRow=None):
+        # Values of several columns at once, one list per column
         sheet = self.workbook[sheetName]
-        for currentRow in range(1, sheet.max_row):
-            value = sheet.cell(row=currentRow, column=columnIndex).value
-            values.append(value)
+        if maxRow is None:
+            maxRow = sheet.max_row
+        if isinstance(sheet, CTable):
+            return [sheet.getColumnValues(column, minRow, maxRow) for column in columns]
+        values = [[] for column in columns]
+        for rowIndex, row in self.getRows(sheetName, columns, minRow, maxRow):
+            for columnValues, value in zip(values, row):
+                columnValues.append(value)
         return values
 
+    def getRow(self, sheetName, rowIndex, columns=None):
+        # Values of a row as a tuple, only of the given columns if specified
+        for index, row in self.getRows(sheetName, columns, rowIndex, rowIndex):
+            return row
+        return ()
+
+    def getRows(self, sheetName, columns=None, minRow=2, maxRow=None, rowFilter=None):
+        # Iterate over (row index, tuple of values) for the rows from minRow
+        # (default skip the header) up to and including maxRow (default last
+        # row). Only the given columns are returned if specified, and only the
+        # rows for which rowFilter(values) is true if given.
+        sheet = self.workbook[sheetName]
+        if maxRow is None:
+            maxRow = sheet.max_row
+        if minRow > maxRow:
+            return
+        if columns is None:
+            columns = range(1, sheet.max_column+1)
+
+        if isinstance(sheet, CTable):
+            rows = zip(*[sheet.getColumnValues(column, minRow, maxRow) for column in columns])
+        else:
+            rows = (tuple(row[column-1] if column <= len(row) else None for column in columns)
+                    for row in sheet.iter_rows(min_row=minRow, max_row=maxRow, values_only=True))
+
+        for rowIndex, row in enumerate(rows, minRow):
+            if rowFilter is None or rowFilter(row):
+                yield rowIndex, row
+
     def setValue(self, sheetIndex, rowIndex, columnIndex, newValue):
         sheet = self.workbook[sheetIndex]
         return sheet.cell(row=rowIndex, column=columnIndex, value=newValue)
 
+    def insertRows(self, sheetName, rowIndex, rows):
+        # Insert a block of rows (each a sequence of values) in front of the
+        # given row in one go instead of one row at a time. Rows after the
+        # last row are appended.
+        sheet = self.workbook[sheetName]
+        if not rows:
+            return 0
+        if rowIndex <= sheet.max_row:
+            sheet.insert_rows(rowIndex, len(rows))
+        for offset, values in enumerate(rows):
+            for columnIndex, value in enumerate(values, 1):
+                sheet.cell(row=rowIndex+offset, column=columnIndex, value=value)
+        return 0
+
+    def mergeRows(self, sheetName, rows):
+        # Insert rows at several places at once. Rows are (row index, values)
+        # with each one going in front of that row of the sheet as it is now.
+        # Returns the row numbers of the new rows in the updated sheet.
+        sheet = self.workbook[sheetName]
+        rows = sorted(rows, key=lambda row: row[0])
+        if isinstance(sheet, CTable):
+            sheet.mergeRows(rows)
+        else:
+            # Start at the bottom so the rows above don't move
+            for rowIndex, values in reversed(rows):
+                self.insertRows(sheetName, rowIndex, [values])
+        return [rowIndex + offset for offset, (rowIndex, values) in enumerate(rows)]
+
     def save(self, newPath=None):
+        with profiler.measure(f"save {self.filename}{self.extension}"):
+            return self.saveWorkbook(newPath)
+
+    def saveWorkbook(self, newPath):
         if not newPath:
             newPath = self.path
+        if self.readOnly:
+            print(f"! '{self.filename}' was opened read only")
+            return 1
         if self.extension == ".xlsx":
             try:
                 self.workbook.save(filename=newPath)
@@ -109,9 +291,90 @@ class CSpreadSheet:
         elif self.extension == ".csv":
             with open(newPath, 'w', newline='') as file:
                 writer = csv.writer(file, delimiter='\t')
-                for row in self.workbook['active'].rows:
-                    writer.writerow([cell.value for cell in row])
+                writer.writerows(self.workbook['active'].iterValues())
             return 0
         else:
             print(f"! Didn't recognise extension {'self.extension'}")
             return 1
+
+    def readRecords(self, f, encoding):
+        # Raw csv records of a file opened in binary mode. The lines are fed
+        # to the same csv reader the file was loaded with, so a record ends
+        # exactly where the reader ends the row.
+        lines = []
+        def readLines():
+            for line in f:
+                lines.append(line)
+                yield line.decode(encoding)
+        for row in csv.reader(readLines(), delimiter='\t'):
+            yield b''.join(lines)
+            lines.clear()
+        if lines:
+            yield b''.join(lines)
+
+    def saveInsertedRows(self, rows, newPath=None):
+        # Write the rows which have been inserted since the csv file was read
+        # (given as row numbers in the sheet as it is now) without rewriting
+        # the rest of the file. The original file is copied record by record
+        # so the rows which didn't change stay exactly the same, including
+        # all their special characters.
+        with profiler.measure(f"save {self.filename}{self.extension}"):
+            return self.writeInsertedRows(rows, newPath)
+
+    def writeInsertedRows(self, rows, newPath):
+        if not newPath:
+            newPath = self.path
+        if self.readOnly:
+            print(f"! '{self.filename}' was opened read only")
+            return 1
+        if self.extension != ".csv":
+            print(f"! Can only insert rows in a csv file, not {self.extension}")
+            return 1
+
+        sheet = self.workbook['active']
+        rows = set(rows)
+
+        # Write new rows with the same line ending and encoding as the file
+        with open(self.path, 'rb') as source:
+            firstLine = source.readline()
+        if firstLine.endswith(b'\r\n') or not firstLine.endswith(b'\n'):
+            lineTerminator = '\r\n'
+        else:
+            lineTerminator = '\n'
+        encoding = locale.getpreferredencoding(False)
+
+        try:
+            with open(self.path, 'rb') as source, open(newPath + '.tmp', 'wb') as destination:
+                records = self.readRecords(source, encoding)
+                # Whether the records in the file don't match the rows loaded
+                mismatch = False
+                record = b''
+                for rowIndex in range(1, sheet.max_row+1):
+                    # Last record of the file might not have a line ending
+                    if record and not record.endswith(b'\n'):
+                        destination.write(lineTerminator.encode(encoding))
+                    if rowIndex in rows:
+                        line = io.StringIO()
+                        writer = csv.writer(line, delimiter='\t', lineterminator=lineTerminator)
+                        writer.writerow(sheet.getValue(rowIndex, column) for column in range(1, sheet.max_column+1))
+                        record = line.getvalue().encode(encoding)
+                    else:
+                        record = next(records, b'')
+                        if not record:
+                            mismatch = True
+                    destination.write(record)
+                # Anything left should be the empty rows at the end of the file
+                # which validate() dropped
+                for record in records:
+                    if record.strip(b'\r\n'):
+                        mismatch = True
+                    destination.write(record)
+            if mismatch:
+                os.remove(newPath + '.tmp')
+                print(f"! Rows in '{self.path}' don't match the rows which were read, not saving")
+                return 1
+            os.replace(newPath + '.tmp', newPath)
+        except PermissionError:
+            print(f"! Couldn't write to '{newPath}'. Still open?")
+            return 1
+        return 0
@@ -0,0 +1,218 @@
+#!/usr/bin/python
+import base64
+import csv
+import datetime
+import os
+import random
+import struct
+import sys
+
+# Module openpyxl needs to be imported separately
+try:
+    import openpyxl
+except ModuleNotFoundError:
+    print("Couldn't import openpyxl. Install with 'pip install openpyxl'.")
+    sys.exit(1)
+
+
+# 16x12 pixel JPEG used for every generated image
+TINY_JPEG = base64.b64decode(
+    '/9j/4AAQSkZJRgABAQAAAQABAAD/2wBDABALDA4MChAODQ4SERATGCgaGBYWGDEjJR0oOjM9PDkzODdASFxOQERXRTc4UG1RV19iZ2hnPk1x'
+    'eXBkeFxlZ2P/2wBDARESEhgVGC8aGi9jQjhCY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2P/wAAR'
+    'CAAMABADASIAAhEBAxEB/8QAFQABAQAAAAAAAAAAAAAAAAAAAAT/xAAUEAEAAAAAAAAAAAAAAAAAAAAA/8QAFQEBAQAAAAAAAAAAAAAAAAAA'
+    'AwT/xAAcEQABAwUAAAAAAAAAAAAAAAACAAEEAxESITH/2gAMAwEAAhEDEQA/AIwEBG5dQyJJ17ZM2l//2Q==')
+
+
+# Builds a made up HPS environment of any size: the RHS datasets, the HPS
+# spreadsheets, imagelib.csv and genera.csv which all agree with each other,
+# and the directories with library and pending images. Used to benchmark
+# prepareImages.py and stats.py without the real (licensed) data.
+class CSyntheticLibrary:
+    SYLLABLES = ['ab', 'ca', 'del', 'phi', 'ro', 'sa', 'ti', 'mo', 'ne', 'lu',
+                 'ver', 'bra', 'gen', 'ia', 'cor', 'pa', 'he', 'lo', 'sty', 'ra']
+    DONORS = ['Helen Cullens', 'Anonymous', 'Unknown', 'Jane Smith', 'Alan Brown',
+              'Ruth Green', 'Peter Grey', 'Ines Dupré']
+
+    def __init__(self, path, numRhs, numPlants, numGardens, numPendingPlants, numPendingGardens, seed=1):
+        self.path = path
+        self.scriptDir = os.path.join(path, 'hps_categorise', '')
+        self.baseDir = os.path.join(path, 'HPS_Images', '')
+        self.numRhs = numRhs
+        self.numPlants = numPlants
+        self.numGardens = numGardens
+        self.numPendingPlants = numPendingPlants
+        self.numPendingGardens = numPendingGardens
+        self.random = random.Random(seed)
+        # Generated RHS records: code, family, genus, species, cultivar, name
+        self.rhsRecords = []
+
+    def createWord(self, minSyllables, maxSyllables):
+        return ''.join(self.random.choice(self.SYLLABLES)
+                       for index in range(self.random.randint(minSyllables, maxSyllables)))
+
+    def createHtml(self, record):
+        html = f"<i>{record['genus']} {record['species']}</i>"
+        if record['cultivar']:
+            html += f" '{record['cultivar']}'"
+        return html
+
+    def createImage(self, path, comment):
+        # Give each image a different comment so they don't all have the same
+        # contents
+        comment = comment.encode('utf-8')[:60000]
+        with open(path, 'wb') as f:
+            f.write(TINY_JPEG[:2] + b'\xff\xfe' + struct.pack('>H', len(comment)+2) + comment + TINY_JPEG[2:])
+
+    def createRhsRecords(self):
+        genera = set()
+        while len(genera) < max(10, self.numRhs // 25):
+            genera.add(self.createWord(2, 4).capitalize())
+        genera = sorted(genera)
+        for index in range(self.numRhs):
+            genus = genera[index % len(genera)]
+            species = self.createWord(2, 4)
+            cultivar = None
+            if self.random.random() < 0.6:
+                cultivar = self.createWord(1, 3).capitalize() + ' ' + self.createWord(2, 3).capitalize()
+                if self.random.random() < 0.05:
+                    cultivar += ' é'
+            name = f"{genus} {species}"
+            if cultivar:
+                name += f" '{cultivar}'"
+            self.rhsRecords.append({'code':     3*index + 1,
+                                    'family':   genus[:4] + 'aceae',
+                                    'genus':    genus,
+                                    'species':  species,
+                                    'cultivar': cultivar,
+                                    'name':     name})
+
+    def createRhsDatasets(self):
+        # Dataset used by prepareImages.py
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet('Table1')
+        sheet.append(["OldSpeciesCode", "CalcTopRankedEntityName", "CalcFullName",
+                      "FamilyName", "GenusName", "SpeciesName", "Subspecies", "Variety", "Subvariety",
+                      "Forma", "TradeSeries", "TradeDesignation", "Cultivar", "Descriptor"])
+        for record in self.rhsRecords:
+            sheet.append([record['code'], f"{record['genus']} {record['species']}", record['name'],
+                          record['family'], record['genus'], record['species'], None, None, None,
+                          None, None, None, record['cultivar'], None])
+        workbook.save(self.scriptDir + "RHS_0923_Reduced_Unlocked.xlsx")
+
+        # Dataset used by stats.py
+        headers = ["NAME_NUM", "ACCEPT_FULL", "NAME", "AWARD", "ALT_NAME_FULL", "FAMILY",
+                   "GENUS", "GEN_HYBR", "SPECIES", "SPEC_AUTH", "SPEC_HYBR", "INFRA_RANK_FULL",
+                   "INFRA_EPI", "INFRA_AUTH", "CULTIVAR", "CULTIVAR_AUTH", "CV_FLAG", "CV_GROUP",
+                   "SOLD_AS", "DESCRIPTOR", "IDENT_QUAL_FULL", "AGG_FLAG_FULL", "GENUS_2", "SPECIES_2",
+                   "SPEC_AUTH_2", "INFRA_RANK_2_FULL", "INFRA_EPI_2", "INFRA_AUTH_2", "CULTIVAR_2", "CULTIVAR_AUTH_2",
+                   "CV_FLAG_2", "CV_GROUP_2", "SOLD_AS_2", "DESCRIPTOR_2", "IDENT_QUAL_FULL_2", "AGG_FLAG_FULL_2",
+                   "NAME_FREE", "GROUP_NAME", "GROUP_NAME_FULL", "PARENTAGE", "ALT_NAME", "NAME_HTML",
+                   "USER3"]
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet('HPS-NAMES May 19')
+        sheet.append(headers)
+        for record in self.rhsRecords:
+            row = [None] * len(headers)
+            row[0] = record['code']                 # NAME_NUM
+            row[1] = 'accepted'                     # ACCEPT_FULL
+            row[2] = record['name']                 # NAME
+            row[5] = record['family']               # FAMILY
+            row[6] = record['genus']                # GENUS
+            row[8] = record['species']              # SPECIES
+            row[14] = record['cultivar']            # CULTIVAR
+            row[41] = self.createHtml(record)       # NAME_HTML
+            sheet.append(row)
+        workbook.save(self.scriptDir + "RHS_Dataset.xlsx")
+
+    def createLibrary(self):
+        # HPS plants and the images of the ones which haven't been withdrawn
+        plantsDir = self.baseDir + 'Plants' + os.sep
+        imagelibRows = [["Caption", "Image ID"]]
+        libraryGenera = {}
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet('Plants')
+        sheet.append(["Plant name",    "Number",            "RHS no",
+                      "RHS status",    "qualifier",         "descriptor",
+                      "image caption", "Donor",             "Date added",
+                      "Slide No.",     "Extra information", "Date withdrawn"])
+        for index in range(self.numPlants):
+            record = self.random.choice(self.rhsRecords)
+            number = f"P{index+1:05}"
+            donor = self.random.choice(self.DONORS)
+            dateAdded = datetime.datetime(2008 + 15*index // max(self.numPlants, 1), 1, 1)
+            # Some images have been withdrawn, but never the last one
+            if index < self.numPlants-1 and self.random.random() < 0.02:
+                sheet.append([record['name'], number, 'WITHDRAWN', None, None, None, None,
+                              donor, dateAdded, None, None, datetime.datetime(2020, 1, 1)])
+                continue
+            sheet.append([record['name'], number, record['code'], 'accepted name', None, None, None,
+                          donor, dateAdded, None, None, None])
+            imagelibRows.append([f"<span RHS>{self.createHtml(record)}</span>", number])
+            libraryGenera.setdefault(record['genus'], record['family'])
+            letterDir = plantsDir + record['name'][0] + os.sep
+            os.makedirs(letterDir, exist_ok=True)
+            self.createImage(letterDir + record['name'].replace('/', '_') + ' ' + number + '.jpg', number)
+        workbook.save(self.scriptDir + "HPS Images - Plants.xlsx")
+
+        # HPS gardens and their images
+        gardensDir = self.baseDir + 'Gardens' + os.sep
+        os.makedirs(gardensDir, exist_ok=True)
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet('Gardens')
+        sheet.append(["Topic",         "Number",    "Donor",
+                      "Date added",    "Slide No.", "Extra Information",
+                      "Date withdrawn"])
+        for index in range(self.numGardens):
+            topic = self.createWord(2, 3).capitalize() + ' House border'
+            number = f"X{index+1:05}"
+            sheet.append([topic, number, self.random.choice(self.DONORS), datetime.datetime(2008, 1, 8),
+                          None, None, None])
+            imagelibRows.append([topic, number])
+            self.createImage(gardensDir + topic + ' ' + number + '.jpg', number)
+        workbook.save(self.scriptDir + "HPS Images - Gardens.xlsx")
+
+        with open(self.scriptDir + "imagelib.csv", 'w', newline='') as f:
+            csv.writer(f, delimiter='\t').writerows(imagelibRows)
+
+        # Alphabetically sorted genera after the same special rows as the
+        # real file
+        with open(self.scriptDir + "genera.csv", 'w', newline='') as f:
+            writer = csv.writer(f, delimiter='\t')
+            writer.writerows([["genus", "family", "notes"],
+                              ["Carpentaria", "Arecaceae", ""],
+                              ["x Chionoscilla", "Asparagaceae", ""],
+                              ["Dolichousnea", "Parmeliaceae", ""],
+                              ["Layia", "Compositae", ""],
+                              ["Vegetable", "Vegetables", ""],
+                              ["XXXXX", "XXXXXXXXXX", ""]])
+            writer.writerows([genus, libraryGenera[genus], ""] for genus in sorted(libraryGenera))
+
+    def createPendingImages(self):
+        # Names follow '<plant name> <RHS number> <donor> <year>', some of the
+        # plants will be new to the library
+        pendingPlantsDir = self.baseDir + 'Pending' + os.sep + 'Plants' + os.sep
+        os.makedirs(pendingPlantsDir, exist_ok=True)
+        for index in range(self.numPendingPlants):
+            record = self.random.choice(self.rhsRecords)
+            donor = self.random.choice(self.DONORS)
+            self.createImage(pendingPlantsDir + f"{record['name']} {record['code']} {donor} 2023.jpg", f"pending {index}")
+
+        pendingGardensDir = self.baseDir + 'Pending' + os.sep + 'Gardens' + os.sep
+        os.makedirs(pendingGardensDir, exist_ok=True)
+        for index in range(self.numPendingGardens):
+            topic = self.createWord(2, 3).capitalize() + ' Manor pond'
+            donor = self.random.choice(self.DONORS)
+            self.createImage(pendingGardensDir + f"{topic} {index+1} {donor} 2023.jpg", f"pending garden {index}")
+
+    def create(self):
+        try:
+            os.makedirs(self.scriptDir, exist_ok=True)
+            os.makedirs(self.baseDir + 'Thumbnails', exist_ok=True)
+            self.createRhsRecords()
+            self.createRhsDatasets()
+            self.createLibrary()
+            self.createPendingImages()
+        except OSError as e:
+            print(f"! Couldn't create synthetic library in '{self.path}': {e}")
+            return 1
+        return 0
@@ -0,0 +1,138 @@
+#!/usr/bin/python
+
+
+# Cell of a CTable, only there for code written against openpyxl cells
+class CTableCell:
+    __slots__ = ('table', 'row', 'column')
+
+    def __init__(self, table, row, column):
+        self.table = table
+        self.row = row
+        self.column = column
+
+    @property
+    def value(self):
+        return self.table.getValue(self.row, self.column)
+
+    @value.setter
+    def value(self, newValue):
+        self.table.setValue(self.row, self.column, newValue)
+
+
+# Lightweight sheet storing its values as plain lists, one per column. It
+# supports the part of the openpyxl worksheet interface we use (max_row,
+# max_column, cell(), insert_rows(), delete_rows(), sheet[row], rows) without
+# creating a cell object for every value. Rows and columns start at 1, like
+# in openpyxl. Columns can be shorter than max_row, missing values are None.
+class CTable:
+    def __init__(self, title):
+        self.title = title
+        self.columns = []
+        self.max_row = 0
+
+    @property
+    def max_column(self):
+        return len(self.columns)
+
+    def getValue(self, row, column):
+        if column > len(self.columns):
+            return None
+        values = self.columns[column-1]
+        if row > len(values):
+            return None
+        return values[row-1]
+
+    def setValue(self, row, column, value):
+        while len(self.columns) < column:
+            self.columns.append([])
+        values = self.columns[column-1]
+        if len(values) < row:
+            values.extend([None] * (row - len(values)))
+        values[row-1] = value
+        if row > self.max_row:
+            self.max_row = row
+
+    def appendRow(self, values, columns=None):
+        # Only the given columns are stored if specified, other values in the
+        # row are dropped
+        if columns is None:
+            while len(self.columns) < len(values):
+                self.columns.append([])
+            for column, value in zip(self.columns, values):
+                # Fill any gap left by shorter rows before this one
+                if len(column) < self.max_row:
+                    column.extend([None] * (self.max_row - len(column)))
+                column.append(value)
+        else:
+            for columnIndex in columns:
+                if columnIndex > len(values):
+                    continue
+                while len(self.columns) < columnIndex:
+                    self.columns.append([])
+                column = self.columns[columnIndex-1]
+                if len(column) < self.max_row:
+                    column.extend([None] * (self.max_row - len(column)))
+                column.append(values[columnIndex-1])
+        self.max_row += 1
+
+    def getColumnValues(self, column, minRow, maxRow):
+        # Values of rows minRow up to and including maxRow of a column
+        values = []
+        if column <= len(self.columns):
+            values = self.columns[column-1][minRow-1:maxRow]
+        if len(values) < maxRow - minRow + 1:
+            values += [None] * (maxRow - minRow + 1 - len(values))
+        return values
+
+    def cell(self, row, column, value=None):
+        if value is not None:
+            self.setValue(row, column, value)
+        return CTableCell(self, row, column)
+
+    def insert_rows(self, idx, amount=1):
+        if idx > self.max_row:
+            return
+        for values in self.columns:
+            if len(values) >= idx:
+                values[idx-1:idx-1] = [None] * amount
+        self.max_row += amount
+
+    def mergeRows(self, rows):
+        # Insert rows at several places in one pass over every column. Rows
+        # are (row, values) sorted on row, each one goes in front of that row
+        # of the table as it is before the merge.
+        width = max([self.max_column] + [len(values) for row, values in rows])
+        while len(self.columns) < width:
+            self.columns.append([])
+        for columnIndex in range(width):
+            oldValues = self.getColumnValues(columnIndex+1, 1, self.max_row)
+            newValues = []
+            start = 0
+            for row, values in rows:
+                end = min(row-1, self.max_row)
+                newValues.extend(oldValues[start:end])
+                start = end
+                newValues.append(values[columnIndex] if columnIndex < len(values) else None)
+            newValues.extend(oldValues[start:])
+            self.columns[columnIndex] = newValues
+        self.max_row += len(rows)
+
+    def delete_rows(self, idx, amount=1):
+        if idx > self.max_row:
+            return
+        for values in self.columns:
+            del values[idx-1:idx-1+amount]
+        self.max_row -= min(amount, self.max_row - idx + 1)
+
+    def iterValues(self):
+        # All rows as tuples of values, padded to the full width of the table
+        for row in range(1, self.max_row+1):
+            yield tuple(self.getValue(row, column) for column in range(1, self.max_column+1))
+
+    def __getitem__(self, row):
+        return tuple(CTableCell(self, row, column) for column in range(1, self.max_column+1))
+
+    @property
+    def rows(self):
+        for row in range(1, self.max_row+1):
+            yield self[row]
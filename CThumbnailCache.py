@@ -0,0 +1,97 @@
+#!/usr/bin/python
+import collections
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+
+# Cache of created thumbnails, keyed by the contents of the source image and
+# the parameters used to create the thumbnail. When the cache grows larger
+# than its maximum size, the least recently used thumbnails are removed.
+class CThumbnailCache:
+    def __init__(self, cacheDir, maxSize):
+        self.cacheDir = cacheDir
+        self.indexPath = cacheDir + 'index.json'
+        self.maxSize = maxSize
+        self.totalSize = 0
+        # Key -> size of thumbnail, least recently used first
+        self.entries = collections.OrderedDict()
+        # Thumbnails are created on multiple threads at the same time
+        self.lock = threading.Lock()
+
+    def load(self):
+        try:
+            os.makedirs(self.cacheDir, exist_ok=True)
+        except OSError:
+            return 1
+        if not os.path.isfile(self.indexPath):
+            return 0
+        try:
+            with open(self.indexPath, 'r') as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            # Start again with an empty cache
+            return 0
+        for key, size in entries:
+            if os.path.isfile(self.cacheDir + key):
+                self.entries[key] = size
+                self.totalSize += size
+        return 0
+
+    def save(self):
+        with self.lock:
+            entries = list(self.entries.items())
+        try:
+            with open(self.indexPath + '.tmp', 'w') as f:
+                json.dump(entries, f)
+            os.replace(self.indexPath + '.tmp', self.indexPath)
+        except OSError:
+            return 1
+        return 0
+
+    def getKey(self, sourcePath, parameters):
+        key = hashlib.sha256()
+        with open(sourcePath, 'rb') as f:
+            for block in iter(lambda: f.read(1024*1024), b''):
+                key.update(block)
+        key.update('\0'.join(parameters).encode('utf-8'))
+        return key.hexdigest()
+
+    def get(self, key, destination):
+        with self.lock:
+            if key not in self.entries:
+                return 1
+            self.entries.move_to_end(key)
+        try:
+            shutil.copyfile(self.cacheDir + key, destination)
+        except OSError:
+            return 1
+        return 0
+
+    def put(self, key, source):
+        try:
+            size = os.path.getsize(source)
+            shutil.copyfile(source, self.cacheDir + key)
+        except OSError:
+            return 1
+
+        with self.lock:
+            if key in self.entries:
+                self.totalSize -= self.entries.pop(key)
+            self.entries[key] = size
+            self.totalSize += size
+            # Remove least recently used thumbnails until we fit again
+            evicted = []
+            while self.totalSize > self.maxSize and len(self.entries) > 1:
+                oldKey, oldSize = self.entries.popitem(last=False)
+                self.totalSize -= oldSize
+                evicted.append(oldKey)
+
+        for oldKey in evicted:
+            try:
+                os.remove(self.cacheDir + oldKey)
+            except OSError:
+                pass
+        return 0
@@ -0,0 +1,257 @@
+#!/usr/bin/python
+from CProfiler import profiler
+from CSpreadSheet import CSpreadSheet
+from CSyntheticLibrary import CSyntheticLibrary
+
+import argparse
+import builtins
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import types
+
+import prepareImages
+import stats
+
+# Force print to always flush
+import functools
+print = functools.partial(print, flush=True)
+
+
+class CBenchmark:
+    # Stages of prepareImages.py in the order main() runs them
+    STAGES = ['validateTools', 'validateInput', 'importImages', 'updateImageInfo',
+              'createAccession', 'copyImagesToUpload', 'updateSpreadsheets']
+
+    def __init__(self, args):
+        self.args = args
+        self.results = []
+        # Without the tools these stages can't run
+        self.haveTools = shutil.which('magick') is not None and shutil.which('exiftool') is not None
+
+    def answer(self, prompt=''):
+        # Answer every question with the default, except keep images which
+        # are too small as the generated images are tiny
+        if 'Make invalid' in prompt:
+            return 'no'
+        return ''
+
+    def createLibrary(self, scale, path):
+        library = CSyntheticLibrary(path,
+                                    numRhs=2*scale,
+                                    numPlants=scale,
+                                    numGardens=max(1, scale//10),
+                                    numPendingPlants=self.args.pending,
+                                    numPendingGardens=max(1, self.args.pending//4))
+        if library.create():
+            return None
+        if self.args.warm:
+            # Parse the spreadsheets once, loaded the same way as each script
+            # loads them, so the runs can use their snapshots
+            cacheDir = library.scriptDir + 'cache' + os.sep
+            loads = [# prepareImages.py
+                     ("imagelib.csv", False, None),
+                     ("genera.csv", False, None),
+                     ("HPS Images - Plants.xlsx", False, None),
+                     ("HPS Images - Gardens.xlsx", False, None),
+                     ("RHS_0923_Reduced_Unlocked.xlsx", True, prepareImages.CHPS.RHS_COLUMNS),
+                     # stats.py, which loads imagelib.csv like prepareImages.py
+                     ("HPS Images - Plants.xlsx", True, stats.CHPS.PLANTS_COLUMNS),
+                     ("RHS_Dataset.xlsx", True, stats.CHPS.RHS_COLUMNS)]
+            for fileName, readOnly, columns in loads:
+                CSpreadSheet(library.scriptDir+fileName, readOnly, columns, cacheDir)
+        return library
+
+    def runPrepareImages(self, library):
+        args = types.SimpleNamespace(dryrun=False,
+                                     checkDuplicates=self.args.checkDuplicates,
+                                     rescan=False,
+                                     fastThumbnails=False,
+                                     thumbnailCacheSize=0,
+                                     workers=self.args.workers,
+                                     scriptDir=library.scriptDir,
+                                     baseDir=library.baseDir)
+        hps = prepareImages.CHPS(args)
+        profiler.reset()
+        ret = 0
+        hps.startLoadingDatabases()
+        try:
+            for stage in self.STAGES:
+                if not self.haveTools and stage in ('validateTools', 'copyImagesToUpload'):
+                    continue
+                if profiler.run(stage, getattr(hps, stage)):
+                    ret = 1
+                    break
+        finally:
+            hps.stopLoadingDatabases()
+        results = profiler.getResults()
+        results['result'] = ret
+        return results
+
+    def runStats(self, library):
+        args = types.SimpleNamespace(gitHubDir=library.scriptDir,
+                                     baseDir=library.baseDir,
+                                     download=False,
+                                     statsJson=None,
+                                     statsCsv=None)
+        hps = stats.CHPS(args)
+        profiler.reset()
+        # Count from about four fifths into the library
+        startCount = f"P{max(1, library.numPlants*4//5):05}"
+        profiler.run('stats', hps.stats, startCount)
+        if not self.args.skipFullAnalysis:
+            profiler.run('fullAnalysis', hps.fullAnalysis)
+        return profiler.getResults()
+
+    def runScale(self, scale):
+        print(f"* Scale {scale}")
+        pristineDir = os.path.join(self.args.dir, str(scale), 'pristine')
+        workDir = os.path.join(self.args.dir, str(scale), 'work')
+        shutil.rmtree(os.path.join(self.args.dir, str(scale)), ignore_errors=True)
+        print("  - Create synthetic library")
+        library = self.createLibrary(scale, pristineDir)
+        if library is None:
+            return 1
+
+        for repeat in range(self.args.repeat):
+            result = {'scale':          scale,
+                      'repeat':         repeat,
+                      'rhsRows':        library.numRhs,
+                      'plants':         library.numPlants,
+                      'gardens':        library.numGardens,
+                      'pendingPlants':  library.numPendingPlants,
+                      'pendingGardens': library.numPendingGardens,
+                      'warm':           self.args.warm}
+
+            # Every script starts with the same library as prepareImages.py
+            # updates it
+            output = io.StringIO()
+            for tool, run in (('prepareImages', self.runPrepareImages), ('stats', self.runStats)):
+                shutil.rmtree(workDir, ignore_errors=True)
+                shutil.copytree(pristineDir, workDir)
+                workLibrary = CSyntheticLibrary(workDir, library.numRhs, library.numPlants, library.numGardens,
+                                                library.numPendingPlants, library.numPendingGardens)
+                with contextlib.redirect_stdout(sys.stdout if self.args.verbose else output):
+                    result[tool] = run(workLibrary)
+            if result['prepareImages']['result']:
+                print(f"  ! prepareImages.py failed at scale {scale}:")
+                print(output.getvalue())
+
+            for tool in ('prepareImages', 'stats'):
+                for stage in result[tool]['stages']:
+                    print(f"  - {tool+'.'+stage['name']:<40} {stage['wall']:>8.2f}s wall {stage['cpu']:>8.2f}s CPU")
+            self.results.append(result)
+
+        if not self.args.keep:
+            shutil.rmtree(os.path.join(self.args.dir, str(scale)), ignore_errors=True)
+        return 0
+
+    def run(self):
+        if not self.haveTools:
+            print("! Can't find 'magick' and 'exiftool', skipping validateTools and copyImagesToUpload")
+
+        # Don't stop at any question
+        builtins.input = self.answer
+        profiler.enabled = True
+        ret = 0
+        for scale in self.args.scales:
+            if self.runScale(scale):
+                ret = 1
+                break
+
+        results = {'date':     datetime.datetime.now().isoformat(timespec='seconds'),
+                   'python':   platform.python_version(),
+                   'platform': platform.platform(),
+                   'cpus':     os.cpu_count(),
+                   'runs':     self.results}
+        try:
+            with open(self.args.output, 'w') as f:
+                json.dump(results, f, indent=2)
+        except OSError:
+            print(f"! Couldn't write results to '{self.args.output}'")
+            return 1
+        print(f"* Results written to '{self.args.output}'")
+        return ret
+
+
+################################################################################
+
+def main():
+    # Process the arguments
+    parser = argparse.ArgumentParser(
+        description='Time prepareImages.py and stats.py on synthetic libraries of different sizes.')
+
+    parser.add_argument(
+        '--scales',
+        type=lambda value: [int(scale) for scale in value.split(',')],
+        default=[1000, 5000],
+        help='Comma separated numbers of library plant images to test with; the RHS dataset is twice as large (default: 1000,5000)'
+    )
+    parser.add_argument(
+        '--pending',
+        type=int,
+        default=20,
+        help='Number of pending plant images, a quarter of that are pending garden images (default: 20)'
+    )
+    parser.add_argument(
+        '--repeat',
+        type=int,
+        default=1,
+        help='Number of runs for each scale (default: 1)'
+    )
+    parser.add_argument(
+        '--warm',
+        action='store_true',
+        help='Run with the spreadsheet snapshots already created'
+    )
+    parser.add_argument(
+        '--checkDuplicates',
+        action='store_true',
+        help='Also check the pending images for duplicates'
+    )
+    parser.add_argument(
+        '--skipFullAnalysis',
+        action='store_true',
+        help="Don't run the full analysis of stats.py"
+    )
+    parser.add_argument(
+        '--workers',
+        type=prepareImages.positiveInt,
+        default=os.cpu_count() or 1,
+        help='Number of images to process at the same time (default: number of cores)'
+    )
+    parser.add_argument(
+        '--dir',
+        default=os.path.join(tempfile.gettempdir(), 'hps_benchmark'),
+        help='Directory to create the synthetic libraries in (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--keep',
+        action='store_true',
+        help="Don't remove the synthetic libraries afterwards"
+    )
+    parser.add_argument(
+        '--output',
+        default='benchmark.json',
+        help='File to write the results to (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--verbose',
+        action='store_true',
+        help='Show the output of the scripts'
+    )
+    args = parser.parse_args()
+
+    benchmark = CBenchmark(args)
+    return benchmark.run()
+
+
+if __name__ == "__main__":
+    ret = main()
+    sys.exit(ret)
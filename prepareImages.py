@@ -1,11 +1,22 @@
 #!/usr/bin/python
+from CExifTool import CExifTool
+from CFileCatalogue import CFileCatalogue
+from CFingerprintCatalogue import CFingerprintCatalogue
 from CImageInfo import CImageInfo
 from CImageInfo import CPendingImageInfo
+from CNameIndex import CNameIndex
+from CProfiler import profiler
 from CSpreadSheet import CSpreadSheet
+from CThumbnailCache import CThumbnailCache
 
 import argparse
+import bisect
+import collections
+import concurrent.futures
 import datetime
+import multiprocessing
 import os
+import pickle
 import re
 import shutil
 import subprocess
@@ -26,18 +37,17 @@ class CHPS:
     RHS_GENUSNAME = 5
     RHS_SPECIESNAME = 6
     RHS_CULTIVAR = 13
+    # Columns we need from the RHS database
+    RHS_COLUMNS = [RHS_OLDSPECIESCODE, RHS_CALCTOPRANKEDENTITYNAME, RHS_CACLFULLNAME,
+                   RHS_FAMILYNAME, RHS_GENUSNAME, RHS_SPECIESNAME, RHS_CULTIVAR]
+
+    # Maximum number of bits two perceptual hashes can differ to still look alike
+    DUPLICATE_DISTANCE = 5
 
     def __init__(self, args):
         self.args = args
 
-        self.scriptDir = 'H:\\hps_categorise\\'
-        self.baseDir = 'H:\\HPS_Images\\'
-        self.plantsDir = self.baseDir + 'Plants\\'
-        self.pendingPlantsDir = self.baseDir + 'Pending\\Plants\\'
-        self.gardensDir = self.baseDir + 'Gardens\\'
-        self.pendingGardensDir = self.baseDir + 'Pending\\Gardens\\'
-        self.thumbsDir = self.baseDir + 'Thumbnails\\'
-        self.uploadDir = self.baseDir + 'Upload_'+datetime.datetime.now().strftime("%d%m%y")+'\\'
+        self.setDirectories(args.scriptDir, args.baseDir)
 
         # Current data
         self.hpsPlantsImageInfo = []
@@ -47,11 +57,27 @@ class CHPS:
         self.pendingPlantsImageInfo = []
         self.pendingGardenImages = True
         self.pendingGardensImageInfo = []
+        # Databases being loaded in the background
+        self.databaseLoader = None
+        self.databaseFutures = {}
+
+    def setDirectories(self, scriptDir, baseDir):
+        # Where the spreadsheets and the images can be found. Both should end
+        # with a path separator
+        self.scriptDir = scriptDir
+        self.baseDir = baseDir
+        self.plantsDir = self.baseDir + 'Plants' + os.sep
+        self.pendingPlantsDir = self.baseDir + 'Pending' + os.sep + 'Plants' + os.sep
+        self.gardensDir = self.baseDir + 'Gardens' + os.sep
+        self.pendingGardensDir = self.baseDir + 'Pending' + os.sep + 'Gardens' + os.sep
+        self.thumbsDir = self.baseDir + 'Thumbnails' + os.sep
+        self.uploadDir = self.baseDir + 'Upload_'+datetime.datetime.now().strftime("%d%m%y") + os.sep
+        self.cacheDir = self.scriptDir + 'cache' + os.sep
         # Upload directories
-        self.uploadPlantsDir = self.uploadDir+'Plants\\'
-        self.uploadGardensDir = self.uploadDir+'Gardens\\'
-        self.uploadThumbsDir = self.uploadDir+'thumbs\\'
-        self.uploadUnknownProvenancePlantsDir = self.uploadDir+'unknownProvenance\\'
+        self.uploadPlantsDir = self.uploadDir + 'Plants' + os.sep
+        self.uploadGardensDir = self.uploadDir + 'Gardens' + os.sep
+        self.uploadThumbsDir = self.uploadDir + 'thumbs' + os.sep
+        self.uploadUnknownProvenancePlantsDir = self.uploadDir + 'unknownProvenance' + os.sep
 
     def validateDirectories(self):
         print("* Validate directories")
@@ -136,13 +162,63 @@ class CHPS:
 
         return 0
 
+    def startLoadingDatabases(self):
+        # The databases don't depend on each other so parse them all at the
+        # same time in separate processes, while the tools and directories are
+        # being validated. Whether a database is needed is only known later
+        # so start on all of them.
+        databases = [(self.scriptDir+"imagelib.csv", False, None),
+                     (self.scriptDir+"genera.csv", False, None),
+                     (self.scriptDir+"HPS Images - Plants.xlsx", False, None),
+                     (self.scriptDir+"HPS Images - Gardens.xlsx", False, None),
+                     (self.scriptDir+"RHS_0923_Reduced_Unlocked.xlsx", True, self.RHS_COLUMNS)]
+        databases = [database for database in databases if os.path.isfile(database[0])]
+        if not databases:
+            return 0
+        self.databaseLoader = multiprocessing.Pool(processes=min(len(databases), self.args.workers))
+        for fileName, readOnly, columns in databases:
+            self.databaseFutures[fileName] = (readOnly, columns, self.databaseLoader.apply_async(loadPickledSpreadSheet, (fileName, readOnly, columns, self.cacheDir, not self.args.dryrun)))
+        self.databaseLoader.close()
+
+        return 0
+
+    def stopLoadingDatabases(self):
+        # Kill the processes of any loads still going, so a database which
+        # isn't needed doesn't hold up exiting the script
+        if self.databaseLoader:
+            self.databaseLoader.terminate()
+            self.databaseLoader.join()
+            self.databaseLoader = None
+        self.databaseFutures = {}
+
+    def loadSpreadSheet(self, fileName, readOnly=False, columns=None):
+        # Take the database loaded in the background if there is one
+        if fileName in self.databaseFutures:
+            futureReadOnly, futureColumns, future = self.databaseFutures.pop(fileName)
+            if futureReadOnly == readOnly and futureColumns == columns:
+                try:
+                    # Time spent in the other process, not waiting for it
+                    return self.recordLoadTime(pickle.loads(future.get()))
+                except Exception:
+                    # Load it here instead so any problem is reported just
+                    # like it would have been without loading in the background
+                    pass
+        return self.recordLoadTime(CSpreadSheet(fileName, readOnly, columns, self.cacheDir, not self.args.dryrun))
+
+    def recordLoadTime(self, spreadSheet):
+        activity = f"load {spreadSheet.filename}{spreadSheet.extension}"
+        if spreadSheet.loadedFromSnapshot:
+            activity += " (snapshot)"
+        profiler.add(activity, spreadSheet.loadTime)
+        return spreadSheet
+
     def createImagelibDB(self):
         fileName = self.scriptDir+"imagelib.csv"
         print(f"  - {fileName}: importing ", end="\r")
         if not os.path.isfile(fileName):
             print("doesn't exist!")
             return 1
-        self.imagelibDB = CSpreadSheet(fileName)
+        self.imagelibDB = self.loadSpreadSheet(fileName)
         print(f"  - {fileName}: OK         ")
 
         return 0
@@ -153,7 +229,7 @@ class CHPS:
         if not os.path.isfile(fileName):
             print("doesn't exist!")
             return 1
-        self.generaDB = CSpreadSheet(fileName)
+        self.generaDB = self.loadSpreadSheet(fileName)
         print(f"  - {fileName}: OK         ")
 
         return 0
@@ -163,29 +239,43 @@ class CHPS:
         # better by checking if files are same or not using requests
         fileName = self.scriptDir+"HPS Images - Plants.xlsx"
         print(f"  - {fileName}: importing  ", end="\r")
-        self.hpsPlantsDB = CSpreadSheet(fileName)
+        self.hpsPlantsDB = self.loadSpreadSheet(fileName)
         print(f"  - {fileName}: OK         ")
 
         return 0
 
+    def createHpsPlantsRhsCount(self):
+        # Count how many images there already are for each RHS number in the
+        # HPS library. Images with multiple plants have their numbers split by
+        # '&&'
+        self.hpsPlantsRhsCount = collections.Counter()
+        for index, (rhsNumbers,) in self.hpsPlantsDB.getRows('Plants', [3]):  # RHS No
+            if not rhsNumbers:
+                continue
+            for rhsNumber in str(rhsNumbers).split('&&'):
+                try:
+                    self.hpsPlantsRhsCount[int(rhsNumber)] += 1
+                except ValueError:
+                    continue
+
+        return 0
+
     def createHpsGardensDB(self):
         # Get the latest version of the gardens database. This needs to be done
         # better by checking if files are same or not using requests
         fileName = self.scriptDir+"HPS Images - Gardens.xlsx"
         print(f"  - {fileName}: importing  ", end="\r")
-        self.hpsGardensDB = CSpreadSheet(fileName)
+        self.hpsGardensDB = self.loadSpreadSheet(fileName)
         print(f"  - {fileName}: OK         ")
 
         return 0
 
     def checkConsistency(self):
-        # Find where the P files (plants) change into X files (gardens)
+        # Last P file (plants) before the X files (gardens)
         imagelibAccession = ""
-        for index in range(2, self.imagelibDB.workbook['active'].max_row):
-            imageID = self.imagelibDB.getValue('active', index, 2)  # Image ID
-            if imageID.startswith("X"):
-                break
-            imagelibAccession = imageID
+        gardensRow = self.findImagelibGardensRow()
+        if gardensRow > 2:
+            imagelibAccession = self.imagelibDB.getValue('active', gardensRow-1, 2)  # Image ID
 
         if self.pendingPlantImages:
             maxRow = self.hpsPlantsDB.workbook['Plants'].max_row
@@ -206,12 +296,21 @@ class CHPS:
 
         return 0
 
+    def findImagelibGardensRow(self):
+        # Find the row where the P files (plants) change into X files
+        # (gardens). Image IDs are sorted so this is a binary search instead
+        # of going through all the rows. Past the last row if there are no
+        # gardens.
+        imageIDs = self.imagelibDB.getColumn('active', 2)  # Image ID
+        return bisect.bisect_left(imageIDs, "X", 1) + 1
+
     def createRhsReferenceDB(self):
         # Get the latest version of the RHS database. This needs to be done better
         # by checking if files are same or not using requests
         fileName = self.scriptDir+"RHS_0923_Reduced_Unlocked.xlsx"
         print(f"  - {fileName}: importing  ", end="\r")
-        self.rhsReferenceDB = CSpreadSheet(fileName)
+        # The RHS dataset is only read, and only a few of its columns are used
+        self.rhsReferenceDB = self.loadSpreadSheet(fileName, True, self.RHS_COLUMNS)
         print(f"  - {fileName}: OK         ")
 
         return 0
@@ -253,6 +352,7 @@ class CHPS:
                                "Slide No.",     "Extra information", "Date withdrawn"]
             if self.hpsPlantsDB.validate('Plants', expectedHeaders):
                 return 1
+            self.createHpsPlantsRhsCount()
 
         # Import 'HPS Images - Gardens.xlsx' which is the central
         # HPS gardens database
@@ -278,6 +378,43 @@ class CHPS:
                                "Forma", "TradeSeries", "TradeDesignation", "Cultivar", "Descriptor"]
             if self.rhsReferenceDB.validate('Table1', expectedHeaders):
                 return 1
+            self.createRhsIndex()
+
+        return 0
+
+    def createRhsIndex(self):
+        # Read the RHS dataset once and index every record by its RHS number
+        # (OldSpeciesCode) so looking up a number doesn't need a scan through
+        # the whole sheet each time. Also index all names to quickly find the
+        # names containing a (part of) a plant name
+        self.rhsIndex = {}
+        self.rhsNameIndex = CNameIndex(self.normaliseName)
+        rows = self.rhsReferenceDB.getRows('Table1', [self.RHS_OLDSPECIESCODE,
+                                                      self.RHS_CACLFULLNAME,
+                                                      self.RHS_FAMILYNAME,
+                                                      self.RHS_GENUSNAME,
+                                                      self.RHS_SPECIESNAME,
+                                                      self.RHS_CULTIVAR])
+        for index, (oldspeciescode, rhsName, family, genus, species, cultivar) in rows:
+            if rhsName:
+                self.rhsNameIndex.add((oldspeciescode, rhsName), rhsName)
+            if not oldspeciescode:
+                continue
+            try:
+                rhsNumber = int(oldspeciescode)
+            except ValueError:
+                continue
+            # Keep the first entry, same as the old row by row search did
+            if rhsNumber in self.rhsIndex:
+                continue
+            self.rhsIndex[rhsNumber] = {
+                'row':      index,
+                'name':     rhsName,
+                'family':   family,
+                'genus':    genus,
+                'species':  species,
+                'cultivar': cultivar}
+        print(f"  - Indexed {len(self.rhsIndex)} RHS numbers")
 
         return 0
 
@@ -320,41 +457,101 @@ class CHPS:
         if self.validateDirectories():
             return 1
 
-        # Validate the xlsx files
-        if self.validateDatabases():
+        # Validate the xlsx files. Any databases still being loaded in the
+        # background after that aren't needed.
+        ret = self.validateDatabases()
+        self.stopLoadingDatabases()
+        if ret:
             return 1
 
         print()
         return 0
 
     def importCurrentImages(self):
+        # The library hardly changes between runs so use the catalogue of the
+        # previous run for all directories that haven't changed
+        catalogue = CFileCatalogue(self.cacheDir+'library.json.gz', self.args.rescan)
+        catalogue.load()
+
         if self.pendingPlantImages:
-            for plantsLetterDir in os.listdir(self.plantsDir):
+            for plantsLetterDir in catalogue.listDirectories(self.plantsDir):
                 print(f"  - directory '{plantsLetterDir}'", end="\r")
-                for filename in os.listdir(self.plantsDir+plantsLetterDir):
-                    fullpath = self.plantsDir + plantsLetterDir + '\\' + filename
-                    self.hpsPlantsImageInfo.append(CImageInfo(fullpath, False))
+                for filename, (size, mtime) in catalogue.scanDirectory(self.plantsDir+plantsLetterDir).items():
+                    fullpath = self.plantsDir + plantsLetterDir + os.sep + filename
+                    imageInfo = CImageInfo(fullpath, False)
+                    imageInfo.size = size
+                    imageInfo.mtime = mtime
+                    self.hpsPlantsImageInfo.append(imageInfo)
             print(f"  - Imported current plant images{' ': <108}")
 
         if self.pendingGardenImages:
-            for filename in os.listdir(self.gardensDir):
-                fullpath = self.gardensDir + '\\' + filename
-                self.hpsGardensImageInfo.append(CImageInfo(fullpath, False))
+            for filename, (size, mtime) in catalogue.scanDirectory(self.gardensDir).items():
+                fullpath = self.gardensDir + filename
+                imageInfo = CImageInfo(fullpath, False)
+                imageInfo.size = size
+                imageInfo.mtime = mtime
+                self.hpsGardensImageInfo.append(imageInfo)
             print(f"  - Imported current garden images{' ': <108}")
 
+        if not self.args.dryrun and catalogue.save():
+            print(f"  ! Couldn't save catalogue of library to '{catalogue.path}'")
+
+    def extractPendingExif(self, imagesInfo):
+        # Reading the exif is mostly waiting for 'magick' to finish so do a
+        # number of images at the same time. Results are reported in the
+        # original order.
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.args.workers) as executor:
+            for imageInfo, ret in zip(imagesInfo, executor.map(CImageInfo.extractExif, imagesInfo)):
+                print(f"  - {imageInfo.filename+imageInfo.extension: <108}", end="\r")
+                if ret:
+                    print(f"  ! Couldn't read exif of '{imageInfo.filename+imageInfo.extension}'. Ignoring image.")
+                    imageInfo.valid = False
+
     def importPendingImages(self):
         if self.pendingPlantImages:
             for filename in os.listdir(self.pendingPlantsDir):
                 fullpath = self.pendingPlantsDir + filename
-                print(f"  - {filename: <108}", end="\r")
-                self.pendingPlantsImageInfo.append(CPendingImageInfo(fullpath))
+                self.pendingPlantsImageInfo.append(CPendingImageInfo(fullpath, False))
+            self.extractPendingExif(self.pendingPlantsImageInfo)
             print(f"  - Imported pending plant images{' ': <108}")
         if self.pendingGardenImages:
             for filename in os.listdir(self.pendingGardensDir):
                 fullpath = self.pendingGardensDir + filename
-                print(f"  - {filename: <108}", end="\r")
-                self.pendingGardensImageInfo.append(CPendingImageInfo(fullpath))
+                self.pendingGardensImageInfo.append(CPendingImageInfo(fullpath, False))
+            self.extractPendingExif(self.pendingGardensImageInfo)
             print(f"  - Imported pending garden images{' ': <108}")
+        if self.args.checkDuplicates:
+            self.checkDuplicates()
+
+    def checkDuplicates(self):
+        # Bring the fingerprints of the library up to date. Only new or changed
+        # images need to be fingerprinted
+        catalogue = CFingerprintCatalogue(self.cacheDir+'fingerprints.json', self.args.workers)
+        catalogue.load()
+        libraryFiles = {imageInfo.path: (imageInfo.size, imageInfo.mtime)
+                        for imageInfo in self.hpsPlantsImageInfo + self.hpsGardensImageInfo}
+        numFingerprinted = catalogue.update(libraryFiles)
+        print(f"  - Fingerprinted {numFingerprinted} new, changed or previously failed library images")
+        if not self.args.dryrun:
+            catalogue.save()
+
+        # Check the pending images against the library
+        pendingImagesInfo = [imageInfo for imageInfo in self.pendingPlantsImageInfo + self.pendingGardensImageInfo
+                             if imageInfo.valid]
+        foundDuplicates = False
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.args.workers) as executor:
+            fingerprints = executor.map(catalogue.fingerprint, [imageInfo.path for imageInfo in pendingImagesInfo])
+            for imageInfo, (md5, perceptualHash) in zip(pendingImagesInfo, fingerprints):
+                imageInfo.md5 = md5
+                identical, similar = catalogue.findDuplicates(md5, perceptualHash, self.DUPLICATE_DISTANCE)
+                for path in identical:
+                    foundDuplicates = True
+                    print(f"  ! '{imageInfo.filename}' is identical to '{path}'")
+                for distance, path in similar:
+                    foundDuplicates = True
+                    print(f"  ! '{imageInfo.filename}' looks like '{path}' ({distance} bits different)")
+        if not foundDuplicates:
+            print("  - No duplicates found in library")
 
     def getImageInfo(self):
         print("* Import existing images")
@@ -388,22 +585,17 @@ class CHPS:
         print()
         return 0
 
+    def normaliseName(self, name):
+        name = name.lower()
+        name = self.convertSpecialChar(name)
+        name = name.replace(' ', '')
+        name = name.replace('[', '')
+        name = name.replace(']', '')
+        name = name.replace("'", "")
+        return name
+
     def constainsName(self, shortName, longName):
-        name1 = shortName.lower()
-        name1 = self.convertSpecialChar(name1)
-        name1 = name1.replace(' ', '')
-        name1 = name1.replace('[', '')
-        name1 = name1.replace(']', '')
-        name1 = name1.replace("'", "")
-
-        name2 = longName.lower()
-        name2 = self.convertSpecialChar(name2)
-        name2 = name2.replace(' ', '')
-        name2 = name2.replace('[', '')
-        name2 = name2.replace(']', '')
-        name2 = name2.replace("'", "")
-
-        if name1 in name2:
+        if self.normaliseName(shortName) in self.normaliseName(longName):
             return True
         return False
 
@@ -440,7 +632,7 @@ class CHPS:
         html = "<i>" + html + "</i>"
         return html
 
-    def createHtmlName(self, index):
+    def createHtmlName(self, rhsRecord):
         # This method wasn't needed in the previous database as the html was included in the
         # NAME_HTML column. This column doesn't exist any longer in the new database so we're
         # having to make it up.
@@ -448,9 +640,9 @@ class CHPS:
         # subspecies/variety/subvariety/... ) but that didn't work as there were too many
         # exceptions (e.g. any names with an ' x ' wasn't visible in any columns). I therefore
         # had to change it to do inline replacement.
-        calcfullname = self.rhsReferenceDB.getValue('Table1', index, self.RHS_CACLFULLNAME)
-        genusname = self.rhsReferenceDB.getValue('Table1', index, self.RHS_GENUSNAME)
-        speciesname = self.rhsReferenceDB.getValue('Table1', index, self.RHS_SPECIESNAME)
+        calcfullname = rhsRecord['name']
+        genusname = rhsRecord['genus']
+        speciesname = rhsRecord['species']
 
         html = calcfullname
 
@@ -605,13 +797,10 @@ class CHPS:
                     foundMatch = False
                     matchingNumbers = []
                     # See if we can find the name in the RHS database to give a best guess
-                    for index in range(2, self.rhsReferenceDB.workbook['Table1'].max_row):
-                        rhsName = self.rhsReferenceDB.getValue('Table1', index, self.RHS_CACLFULLNAME)
-                        if rhsName:
-                            if self.constainsName(name, rhsName):
-                                found = True
-                                matchingNumbers.append(self.rhsReferenceDB.getValue('Table1', index, self.RHS_OLDSPECIESCODE))
-                                print(f"        -> found name in RHS dataset as number '{self.rhsReferenceDB.getValue('Table1', index, 1)}', name '{rhsName}'")
+                    for oldspeciescode, rhsName in self.rhsNameIndex.find(name):
+                        found = True
+                        matchingNumbers.append(oldspeciescode)
+                        print(f"        -> found name in RHS dataset as number '{oldspeciescode}', name '{rhsName}'")
                     # We managed to extract an RHS number from the file name. Check
                     # if correct
                     if rhsNumber != 0:
@@ -619,15 +808,12 @@ class CHPS:
                         # See if we can find the number in the RHS database to give
                         # the expected name which we can compare with the name
                         # extracted from the file name
-                        for index in range(2, self.rhsReferenceDB.workbook['Table1'].max_row):
-                            oldspeciescode = self.rhsReferenceDB.getValue('Table1', index, self.RHS_OLDSPECIESCODE)
-                            if oldspeciescode and int(oldspeciescode) == rhsNumber:
-                                if rhsNumber in matchingNumbers:
-                                    foundMatch = True
-                                found = True
-                                val = self.rhsReferenceDB.getValue('Table1', index, self.RHS_CACLFULLNAME)
-                                print(f"        -> found number in the RHS dataset as RHS name  '{val}'")
-                                break
+                        rhsRecord = self.rhsIndex.get(rhsNumber)
+                        if rhsRecord:
+                            if rhsNumber in matchingNumbers:
+                                foundMatch = True
+                            found = True
+                            print(f"        -> found number in the RHS dataset as RHS name  '{rhsRecord['name']}'")
                         if not found:
                             rhsNumber = 0
                         else:
@@ -635,7 +821,7 @@ class CHPS:
                                 rhsNumbers.append(rhsNumber)
                                 rhsNames.append("")
                             else:
-                                val = input(f"    Accept RHS number '{rhsNumber}'? (Y/n) ")
+                                val = profiler.input(f"    Accept RHS number '{rhsNumber}'? (Y/n) ")
                                 if not val or val.lower() == 'y':
                                     rhsNumbers.append(rhsNumber)
                                     rhsNames.append("")
@@ -645,7 +831,7 @@ class CHPS:
                     # or the number was wrong
                     if rhsNumber == 0:
                         # We didn't manage to extract an RHS number from the file name
-                        val = input("    Specify RHS number ('enter' for unknown provenance ; for multiple, split by ','): ")
+                        val = profiler.input("    Specify RHS number ('enter' for unknown provenance ; for multiple, split by ','): ")
                         if not val:
                             print("    Put on list of unknown provenance'")
                             imageInfo.unknownProvenance = True
@@ -680,44 +866,32 @@ class CHPS:
                     rhsNumbersFound += 1  # technically not correct but makes it easier further down the line to pretend we did
                     continue
                 # Find the data in the RHS data set for given RHS number
-                for index in range(2, self.rhsReferenceDB.workbook['Table1'].max_row):
-                    oldspeciescode = self.rhsReferenceDB.getValue('Table1', index, self.RHS_OLDSPECIESCODE)
-                    if oldspeciescode and int(oldspeciescode) == num:
-                        imageInfo.rhsFamily.append(self.rhsReferenceDB.getValue('Table1', index, self.RHS_FAMILYNAME))
-                        imageInfo.rhsGenus.append(self.rhsReferenceDB.getValue('Table1', index, self.RHS_GENUSNAME))
-                        imageInfo.rhsSpecies.append(self.rhsReferenceDB.getValue('Table1', index, self.RHS_SPECIESNAME))
-                        imageInfo.rhsCultivar.append(self.rhsReferenceDB.getValue('Table1', index, self.RHS_CULTIVAR))
-                        imageInfo.rhsNames.append(self.rhsReferenceDB.getValue('Table1', index, self.RHS_CACLFULLNAME))  # NAME
-                        imageInfo.rhsHtml.append(self.createHtmlName(index))
-                        rhsNumbersFound += 1
-                        # Now that we have found the data, check if this is
-                        # a new addition to the HPS library (interesting to
-                        # know
-                        samePlants = 0
-                        for index in range(2, self.hpsPlantsDB.workbook['Plants'].max_row):
-                            intnum = self.hpsPlantsDB.getValue('Plants', index, 3)  # RHS No
-                            if not intnum:
-                                continue
-                            try:
-                                int(intnum)
-                            except ValueError:
-                                continue
-                            if int(intnum) == num:
-                                samePlants += 1
-                        if samePlants == 0:
-                            newPlants += 1
-                            print("  ! New plant in the list")
-                        else:
-                            print(f"    There are already {samePlants} images of this plant in the list")
-                            # Now is the time to validate the image size as we
-                            # want to add an image even if it's too small when
-                            # there's no other in the list yet.
-                            if imageInfo.validateSize():
-                                print(f"  ! pending image {imageInfo.filename} is too small ({imageInfo.width}x{imageInfo.height})")
-                                val = input("      Make invalid [YES/no] ? ")
-                                if not val or val == 'YES' or val == 'yes':
-                                    imageInfo.valid = False
-                        break
+                rhsRecord = self.rhsIndex.get(num)
+                if rhsRecord:
+                    imageInfo.rhsFamily.append(rhsRecord['family'])
+                    imageInfo.rhsGenus.append(rhsRecord['genus'])
+                    imageInfo.rhsSpecies.append(rhsRecord['species'])
+                    imageInfo.rhsCultivar.append(rhsRecord['cultivar'])
+                    imageInfo.rhsNames.append(rhsRecord['name'])  # NAME
+                    imageInfo.rhsHtml.append(self.createHtmlName(rhsRecord))
+                    rhsNumbersFound += 1
+                    # Now that we have found the data, check if this is
+                    # a new addition to the HPS library (interesting to
+                    # know
+                    samePlants = self.hpsPlantsRhsCount[num]
+                    if samePlants == 0:
+                        newPlants += 1
+                        print("  ! New plant in the list")
+                    else:
+                        print(f"    There are already {samePlants} images of this plant in the list")
+                        # Now is the time to validate the image size as we
+                        # want to add an image even if it's too small when
+                        # there's no other in the list yet.
+                        if imageInfo.validateSize():
+                            print(f"  ! pending image {imageInfo.filename} is too small ({imageInfo.width}x{imageInfo.height})")
+                            val = profiler.input("      Make invalid [YES/no] ? ")
+                            if not val or val == 'YES' or val == 'yes':
+                                imageInfo.valid = False
 
             # Clearly something went wrong if we did't find all the numbers.
             # Can happen if the database is out of date and plant is on the RHS
@@ -727,20 +901,20 @@ class CHPS:
                     print("        ! Can't find corresponding plant")
                 else:
                     print("        ! Can't find all corresponding plants")
-                val = input(f"  - Want to continue with {rhsNumbers} (y/N) ? ")
+                val = profiler.input(f"  - Want to continue with {rhsNumbers} (y/N) ? ")
                 if not val:
                     imageInfo.valid = False
                     continue
 
             # Check if donor name extracted from file name is correct
             if donor:
-                val = input(f"  - Got donor as '{donor.rstrip()}'. Is this correct? (Y/n) ")
+                val = profiler.input(f"  - Got donor as '{donor.rstrip()}'. Is this correct? (Y/n) ")
                 # If a value is given (i.e. 'n') then delete donor name
                 if val:
                     donor = None
             # If still no donor name then ask for it
             if not donor:
-                donor = input("  - Please give donor name (note possible 'Anonymous' or 'Unknown'): ")
+                donor = profiler.input("  - Please give donor name (note possible 'Anonymous' or 'Unknown'): ")
             imageInfo.donor = donor.rstrip()
 
             # If no date was extracted from the file name then take current date
@@ -755,6 +929,11 @@ class CHPS:
                 print(f"  - Got meta data added as '{metaData}'")
                 imageInfo.metaData = metaData
 
+            # This image will be added to the library so count it for any
+            # following images of the same plant
+            if imageInfo.valid:
+                self.hpsPlantsRhsCount.update(num for num in rhsNumbers if num != 0)
+
         if newPlants > 0:
             print(f"! Got {newPlants} new plants")
 
@@ -826,31 +1005,25 @@ class CHPS:
                 shutil.copyfile(self.scriptDir+self.imagelibDB.filename+self.imagelibDB.extension, self.scriptDir+backupimagelibDB)
             print(f"* Update '{self.scriptDir+self.imagelibDB.filename+self.imagelibDB.extension}': image database used by website")
             # Find where the P files (plants) change into X files (gardens)
-            padd = 0
-            for index in range(2, self.imagelibDB.workbook['active'].max_row):
-                imageID = self.imagelibDB.getValue('active', index, 2)  # Image ID
-                if imageID.startswith("X"):
-                    padd = index
-                    break
-            validFiles = 0
+            padd = self.findImagelibGardensRow()
+            newRows = []
             for imageInfo in self.pendingPlantsImageInfo:
                 if imageInfo.valid is False or imageInfo.unknownProvenance is True:
                     continue
-                # Insert plants at end of P files
-                self.imagelibDB.workbook['active'].insert_rows(padd)
                 html = "<span RHS>" + imageInfo.rhsHtml[0] + "</span>"
                 for index in range(1, len(imageInfo.rhsHtml)):
                     html += " && <span RHS>" + imageInfo.rhsHtml[index] + "</span>"
-                self.imagelibDB.setValue('active', padd, 1,  html)  # Caption
-                self.imagelibDB.setValue('active', padd, 2, f"P{imageInfo.accession:05}")  # Image ID
-                validFiles += 1
-                padd += 1
+                newRows.append([html, f"P{imageInfo.accession:05}"])  # Caption, Image ID
+            # Insert plants at end of P files
+            self.imagelibDB.insertRows('active', padd, newRows)
+            validFiles = len(newRows)
             if validFiles == 0:
                 print("! No data to write")
             else:
                 if not self.args.dryrun:
                     try:
-                        self.imagelibDB.save(self.scriptDir+self.imagelibDB.filename+self.imagelibDB.extension)
+                        # Only write the new rows, the rest of the file is copied as is
+                        self.imagelibDB.saveInsertedRows(range(padd, padd+validFiles), self.scriptDir+self.imagelibDB.filename+self.imagelibDB.extension)
                     except PermissionError:
                         print("  ! Permission error writing to {}".format(self.imagelibDB.fileName))
 
@@ -862,35 +1035,33 @@ class CHPS:
                 shutil.copyfile(self.scriptDir+self.generaDB.filename+self.generaDB.extension, self.scriptDir+backupGeneraDB)
             print(f"* Update '{self.scriptDir+self.generaDB.filename+self.generaDB.extension}': alphabetically sorted list of genera we have pictures of. Used by website.")
             existingGenus = self.generaDB.getColumn('active', 1)
-            genusAdded = False
+            knownGenus = set(existingGenus)
+            # Collect all new genera first, the family of the first image wins
+            newGenus = {}
             for imageInfo in self.pendingPlantsImageInfo:
                 if imageInfo.valid is False or imageInfo.unknownProvenance is True:
                     continue
                 # Add the genus to the spreadsheet if it's not already there
-                if len(imageInfo.rhsGenus) == 0:
-                    continue
                 for index in range(len(imageInfo.rhsGenus)):
                     genus = imageInfo.rhsGenus[index].capitalize()
-                    if genus in existingGenus:
+                    if genus in knownGenus:
                         # genus already in database
                         continue
-                    for rhsGenus in existingGenus:
-                        # First 7 rows don't contain valid compare data
-                        if existingGenus.index(rhsGenus)<8:
-                            continue
-                        if genus < rhsGenus:
-                            print(f"  - Inserting new genus {genus}, family {imageInfo.rhsFamily[index].capitalize()} in row {existingGenus.index(rhsGenus)}")
-                            self.generaDB.workbook['active'].insert_rows(existingGenus.index(rhsGenus)+1)
-                            self.generaDB.setValue('active', existingGenus.index(rhsGenus)+1, 1, genus)
-                            self.generaDB.setValue('active', existingGenus.index(rhsGenus)+1, 2, imageInfo.rhsFamily[index].capitalize())
-                            genusAdded = True
-                            # Recreate the list of existing genus as a new one has just been added
-                            existingGenus = self.generaDB.getColumn('active', 1)
-                            break
-            if genusAdded:
+                    knownGenus.add(genus)
+                    newGenus[genus] = imageInfo.rhsFamily[index].capitalize()
+            # Find where each one goes in the sorted list. First 8 rows don't
+            # contain valid compare data. Genera after the last one are
+            # appended.
+            newRows = []
+            for genus in sorted(newGenus):
+                newRows.append((bisect.bisect_left(existingGenus, genus, 8) + 1, [genus, newGenus[genus]]))
+            genusRows = self.generaDB.mergeRows('active', newRows)
+            for row, (index, (genus, family)) in zip(genusRows, newRows):
+                print(f"  - Inserting new genus {genus}, family {family} in row {row}")
+            if genusRows:
                 if not self.args.dryrun:
                     try:
-                        self.generaDB.save(self.scriptDir+self.generaDB.filename+self.generaDB.extension)
+                        self.generaDB.saveInsertedRows(genusRows, self.scriptDir+self.generaDB.filename+self.generaDB.extension)
                     except PermissionError:
                         print("  ! Permission error writing to {}".format(self.generaDB.fileName))
             else:
@@ -930,6 +1101,7 @@ class CHPS:
             else:
                 shutil.copyfile(self.scriptDir+self.imagelibDB.filename+self.imagelibDB.extension, self.scriptDir+backupimagelibDB)
             print(f"* Update '{self.scriptDir+self.imagelibDB.filename+self.imagelibDB.extension}': image database used by website")
+            firstNewRow = self.imagelibDB.workbook['active'].max_row+1
             validFiles = 0
             for imageInfo in self.pendingGardensImageInfo:
                 if imageInfo.valid is False:
@@ -944,7 +1116,7 @@ class CHPS:
             else:
                 if not self.args.dryrun:
                     try:
-                        self.imagelibDB.save(self.scriptDir+self.imagelibDB.filename+self.imagelibDB.extension)
+                        self.imagelibDB.saveInsertedRows(range(firstNewRow, self.imagelibDB.workbook['active'].max_row+1), self.scriptDir+self.imagelibDB.filename+self.imagelibDB.extension)
                     except PermissionError:
                         print("  ! Permission error writing to {}".format(self.imagelibDB.fileName))
 
@@ -955,90 +1127,72 @@ class CHPS:
         print("Copy images")
         print("-----------")
 
-        if self.pendingPlantImages:
-            # Copy plant images into upload directory and remove GPS data
-            print(f"* Copy plant images to '{self.uploadPlantsDir}'")
-            for imageInfo in self.pendingPlantsImageInfo:
-                if imageInfo.valid is False or imageInfo.unknownProvenance is True:
-                    continue
-                startletter = imageInfo.getRHSName()[0]
-                # Copy from pending to dropbox upload directory
-                if not self.args.dryrun:
-                    os.makedirs(self.uploadPlantsDir+startletter, exist_ok=True)
-                newFilename = self.uploadPlantsDir+startletter+"\\"+self.convertSpecialChar(imageInfo.getRHSName())+" P{:05d}".format(imageInfo.accession)+imageInfo.getReformattedExtension()
-                if not self.args.dryrun:
-                    try:
-                        shutil.copy2(imageInfo.path, newFilename)
-                    except OSError as e:
-                        print(f"! Can't copy file. Error: {e}")
-                        imageInfo.valid = False
+        # Use one exiftool process to remove the GPS data of all images
+        with CExifTool() as exifTool:
+            if not self.args.dryrun and exifTool.start():
+                print("! Couldn't start 'exiftool'")
+                return 1
+
+            if self.pendingPlantImages:
+                # Copy plant images into upload directory and remove GPS data
+                print(f"* Copy plant images to '{self.uploadPlantsDir}'")
+                for imageInfo in self.pendingPlantsImageInfo:
+                    if imageInfo.valid is False or imageInfo.unknownProvenance is True:
                         continue
-                    subprocess.Popen(["exiftool",
-                                      "-gpsaltitude=",
-                                      "-gpslatitude=",
-                                      "-gpslongitude=",
-                                      "-overwrite_original",
-                                      newFilename],
-                                     stdout=subprocess.PIPE).communicate()
+                    startletter = imageInfo.getRHSName()[0]
+                    # Copy from pending to dropbox upload directory
+                    if not self.args.dryrun:
+                        os.makedirs(self.uploadPlantsDir+startletter, exist_ok=True)
+                    newFilename = self.uploadPlantsDir+startletter+os.sep+self.convertSpecialChar(imageInfo.getRHSName())+" P{:05d}".format(imageInfo.accession)+imageInfo.getReformattedExtension()
+                    if not self.args.dryrun:
+                        try:
+                            shutil.copy2(imageInfo.path, newFilename)
+                        except OSError as e:
+                            print(f"! Can't copy file. Error: {e}")
+                            imageInfo.valid = False
+                            continue
+                        if exifTool.removeGps(newFilename):
+                            print(f"! Can't remove GPS data from '{newFilename}'")
+                            imageInfo.valid = False
+                            continue
 
-        if self.pendingGardenImages:
-            # Copy garden images into upload directory and remove GPS data
-            print(f"* Copy garden images to upload directory '{self.uploadGardensDir}'")
-            for imageInfo in self.pendingGardensImageInfo:
-                if imageInfo.valid is False:
-                    continue
-                # Copy from pending to dropbox upload directory
-                if not self.args.dryrun:
-                    os.makedirs(self.uploadGardensDir, exist_ok=True)
-                newFilename = self.uploadGardensDir+"\\"+imageInfo.gardenName+" X{:05d}".format(imageInfo.accession)+imageInfo.getReformattedExtension()
-                if not self.args.dryrun:
-                    try:
-                        shutil.copy2(imageInfo.path, newFilename)
-                    except OSError as e:
-                        print(f"! Can't copy file. Error: {e}")
-                        imageInfo.valid = False
+            if self.pendingGardenImages:
+                # Copy garden images into upload directory and remove GPS data
+                print(f"* Copy garden images to upload directory '{self.uploadGardensDir}'")
+                for imageInfo in self.pendingGardensImageInfo:
+                    if imageInfo.valid is False:
                         continue
-                    subprocess.Popen(["exiftool",
-                                      "-gpsaltitude=",
-                                      "-gpslatitude=",
-                                      "-gpslongitude=",
-                                      "-overwrite_original",
-                                      newFilename],
-                                     stdout=subprocess.PIPE).communicate()
+                    # Copy from pending to dropbox upload directory
+                    if not self.args.dryrun:
+                        os.makedirs(self.uploadGardensDir, exist_ok=True)
+                    newFilename = self.uploadGardensDir+imageInfo.gardenName+" X{:05d}".format(imageInfo.accession)+imageInfo.getReformattedExtension()
+                    if not self.args.dryrun:
+                        try:
+                            shutil.copy2(imageInfo.path, newFilename)
+                        except OSError as e:
+                            print(f"! Can't copy file. Error: {e}")
+                            imageInfo.valid = False
+                            continue
+                        if exifTool.removeGps(newFilename):
+                            print(f"! Can't remove GPS data from '{newFilename}'")
+                            imageInfo.valid = False
+                            continue
 
         # Create thumbnails: resize, auto orientate, remove exif, add watermark
         print(f"* Create thumbnails in {self.uploadThumbsDir}")
-        # The watermark will appear in the middle bottom, white, offset by 12 pixels.
-        watermarkText = "gravity south fill white text 0,12 'Hardy Plant Society\\nwww.hardy-plant.org.uk'"
-
         if not self.args.dryrun:
             os.makedirs(self.uploadThumbsDir, exist_ok=True)
+        # Collect all thumbnails first so they can be created in parallel
+        thumbnails = []
         if self.pendingPlantImages:
             for imageInfo in self.pendingPlantsImageInfo:
                 if imageInfo.valid is False or imageInfo.unknownProvenance is True:
                     continue
                 startletter = imageInfo.getRHSName()[0]
-                oldFilename = self.uploadPlantsDir+startletter+"\\"+self.convertSpecialChar(imageInfo.getRHSName())+" P{:05d}".format(imageInfo.accession)+imageInfo.getReformattedExtension()
+                oldFilename = self.uploadPlantsDir+startletter+os.sep+self.convertSpecialChar(imageInfo.getRHSName())+" P{:05d}".format(imageInfo.accession)+imageInfo.getReformattedExtension()
                 oldFilename = oldFilename.replace(u'/', u'_')
                 newFilename = self.uploadThumbsDir+"P{:05d}".format(imageInfo.accession)+imageInfo.getReformattedExtension()
-
-                # Convert image
-                if not self.args.dryrun:
-                    out = subprocess.Popen(["magick",
-                                            oldFilename,
-                                            "-resize", "350x350",   # Maximum size
-                                            "-density", "72",       # DPI
-                                            "-auto-orient",         # Orientation
-                                            "-strip",               # Strip of any comments or profiles (e.g. exif)
-                                            "-font", "Microsoft-Sans-Serif",
-                                            "-pointsize", "8.25",
-                                            "-draw", watermarkText,
-                                            newFilename], stdout=subprocess.PIPE)
-                    stdout, stderr = out.communicate()
-                    if out.returncode != 0:
-                        print("  ! Error")
-                        imageInfo.valid = False
-                        continue
+                thumbnails.append((imageInfo, oldFilename, newFilename))
 
             # Copy plant of unknown provenance into separate directory
             foundUnknownProvenance = False
@@ -1069,28 +1223,79 @@ class CHPS:
                 oldFilename = self.uploadGardensDir+imageInfo.gardenName+" X{:05d}".format(imageInfo.accession)+imageInfo.getReformattedExtension()
                 oldFilename = oldFilename.replace(u'/', u'_')
                 newFilename = self.uploadThumbsDir+"X{:05d}".format(imageInfo.accession)+imageInfo.getReformattedExtension()
+                thumbnails.append((imageInfo, oldFilename, newFilename))
 
-                # Convert image
-                if not self.args.dryrun:
-                    out = subprocess.Popen(["magick",
-                                            oldFilename,
-                                            "-resize", "350x350",   # Maximum size
-                                            "-density", "72",       # DPI
-                                            "-auto-orient",         # Orientation
-                                            "-strip",               # Strip of any comments or profiles (e.g. exif)
-                                            "-font", "Microsoft-Sans-Serif",
-                                            "-pointsize", "8.25",
-                                            "-draw", watermarkText,
-                                            newFilename], stdout=subprocess.PIPE)
-                    stdout, stderr = out.communicate()
-                    if out.returncode != 0:
-                        print("  ! Error")
-                        imageInfo.valid = False
-                        continue
+        # Convert images
+        if not self.args.dryrun:
+            self.createThumbnails(thumbnails)
 
         print()
         return 0
 
+    def createThumbnail(self, imageInfo, oldFilename, newFilename, cache):
+        # The watermark will appear in the middle bottom, white, offset by 12 pixels.
+        watermarkText = "gravity south fill white text 0,12 'Hardy Plant Society\\nwww.hardy-plant.org.uk'"
+
+        decodeOptions = []
+        if self.args.fastThumbnails:
+            # Let the JPEG decoder scale the image down while decoding it. It
+            # only scales by powers of 2 and never below the given size so
+            # there's still enough detail for the final resize
+            decodeOptions = ["-define", "jpeg:size=700x700"]
+        options = ["-resize", "350x350",   # Maximum size
+                   "-density", "72",       # DPI
+                   "-auto-orient",         # Orientation
+                   "-strip",               # Strip of any comments or profiles (e.g. exif)
+                   "-font", "Microsoft-Sans-Serif",
+                   "-pointsize", "8.25",
+                   "-draw", watermarkText]
+
+        # Reuse the thumbnail from an earlier run if neither the image nor
+        # the way we create thumbnails has changed
+        key = None
+        if cache:
+            try:
+                key = cache.getKey(imageInfo.path, decodeOptions + options)
+            except OSError:
+                key = None
+            if key and cache.get(key, newFilename) == 0:
+                return 0
+
+        try:
+            with profiler.measure('magick (thumbnail)'):
+                out = subprocess.Popen(["magick"] + decodeOptions + [oldFilename] + options + [newFilename],
+                                       stdout=subprocess.PIPE)
+                out.communicate()
+        except OSError:
+            return 1
+
+        if out.returncode == 0 and key:
+            cache.put(key, newFilename)
+        return out.returncode
+
+    def createThumbnails(self, thumbnails):
+        cache = None
+        if self.args.thumbnailCacheSize > 0:
+            cache = CThumbnailCache(self.cacheDir+'thumbnails'+os.sep, self.args.thumbnailCacheSize*1024*1024)
+            if cache.load():
+                print(f"  ! Can't use thumbnail cache in '{cache.cacheDir}'")
+                cache = None
+
+        # Each thumbnail is a separate 'magick' process so run as many at the
+        # same time as we have workers (cores by default)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.args.workers) as executor:
+            futures = [executor.submit(self.createThumbnail, imageInfo, oldFilename, newFilename, cache)
+                       for imageInfo, oldFilename, newFilename in thumbnails]
+            for (imageInfo, oldFilename, newFilename), future in zip(thumbnails, futures):
+                if future.result() != 0:
+                    print(f"  ! Error creating thumbnail '{newFilename}'")
+                    imageInfo.valid = False
+
+        if cache:
+            cache.save()
+
+        return 0
+
     def printFinalise(self):
         print("Finally")
         print("-------")
@@ -1114,6 +1319,22 @@ class CHPS:
 ################################################################################
 
 
+def loadPickledSpreadSheet(*args):
+    # Loads a database in the background. It's sent back already pickled so
+    # one which can't be unpickled fails in loadSpreadSheet, which then loads
+    # it itself, rather than in the pool where its result would never arrive.
+    # openpyxl workbooks loaded from a snapshot can't be unpickled again.
+    return pickle.dumps(CSpreadSheet(*args), protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def positiveInt(value):
+    # Argument type for numbers which have to be at least 1
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"should be at least 1, got {number}")
+    return number
+
+
 def main():
     # Process the arguments
     parser = argparse.ArgumentParser(
@@ -1122,7 +1343,7 @@ def main():
         epilog='''
 Usage
 -----
-The base directory where all images can be found from is defined in self.baseDir
+The base directory where all images can be found from is given with --baseDir
 
 It can then find the directories containing all the plant images, garden images,
 pending plant images, pending garden images and the upload directory from that
@@ -1157,38 +1378,105 @@ would suggest adding an extra space before/after the RHS number
         action='store_true',
         help='Run without saving/creating any files'
     )
+    parser.add_argument(
+        '--checkDuplicates',
+        action='store_true',
+        help='Check pending images for (near) duplicates in the library'
+    )
+    parser.add_argument(
+        '--rescan',
+        action='store_true',
+        help='''Look at every library image again, not only those in directories that
+changed since the last run. Needed to pick up images overwritten in place,
+e.g. for --checkDuplicates to fingerprint them again'''
+    )
+    parser.add_argument(
+        '--fastThumbnails',
+        action='store_true',
+        help='Only decode JPEG images at the resolution needed for the thumbnails'
+    )
+    parser.add_argument(
+        '--thumbnailCacheSize',
+        type=int,
+        default=200,
+        help='Maximum size in MB of the cache of created thumbnails, 0 to disable (default: 200)'
+    )
+    parser.add_argument(
+        '--workers',
+        type=positiveInt,
+        default=os.cpu_count() or 1,
+        help='Number of images to process at the same time (default: number of cores)'
+    )
+    parser.add_argument(
+        '--scriptDir',
+        default='H:\\hps_categorise\\',
+        type=lambda value: os.path.join(value, ''),
+        help='Directory with the spreadsheets, a path separator is added at the end if missing (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--baseDir',
+        default='H:\\HPS_Images\\',
+        type=lambda value: os.path.join(value, ''),
+        help='Directory with the plant, garden and pending images, a path separator is added at the end if missing (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Print how long each stage, external tool, spreadsheet and prompt took'
+    )
+    parser.add_argument(
+        '--profileOutput',
+        help='Also write the profile as JSON to the given file'
+    )
     args = parser.parse_args()
 
+    profiler.enabled = args.profile or args.profileOutput is not None
+
     # Construct the base class
     hps = CHPS(args)
 
     print()
 
+    try:
+        ret = processImages(hps)
+    finally:
+        hps.stopLoadingDatabases()
+        profiler.printSummary()
+        if args.profileOutput:
+            profiler.save(args.profileOutput)
+
+    return ret
+
+
+def processImages(hps):
+    # Start loading the databases while checking tools and directories
+    hps.startLoadingDatabases()
+
     # Check if required tools exist
-    if hps.validateTools():
+    if profiler.run('validateTools', hps.validateTools):
         return 1
 
     # Check if required directories and xlsx files exist and are valid
-    if hps.validateInput():
+    if profiler.run('validateInput', hps.validateInput):
         return 1
 
     # Import the pending and HPS library images
-    if hps.importImages():
+    if profiler.run('importImages', hps.importImages):
         return 1
 
     # Get the RHS numbers of the pending images
-    if hps.updateImageInfo():
+    if profiler.run('updateImageInfo', hps.updateImageInfo):
         return 1
 
     # Create accession numbers for all the pending images
-    if hps.createAccession():
+    if profiler.run('createAccession', hps.createAccession):
         return 1
 
     # Copy the pending images to new directory, ready to be uploaded
-    if hps.copyImagesToUpload():
+    if profiler.run('copyImagesToUpload', hps.copyImagesToUpload):
         return 1
 
-    if hps.updateSpreadsheets():
+    if profiler.run('updateSpreadsheets', hps.updateSpreadsheets):
         return 1
 
     hps.printFinalise()
@@ -1199,5 +1487,3 @@ would suggest adding an extra space before/after the RHS number
 if __name__ == "__main__":
     ret = main()
     sys.exit(ret)
-
-sys.exit(1)
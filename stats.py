@@ -1,7 +1,11 @@
 #!/usr/bin/python
+from CFileCatalogue import CFileCatalogue
+from CLibraryStats import CLibraryStats
+from CRowRule import CRowRule, applyRowRules
 from CSpreadSheet import CSpreadSheet
 
 import argparse
+import collections
 import os
 import re
 import sys
@@ -11,13 +15,24 @@ import urllib.request
 import functools
 print = functools.partial(print, flush=True)
 
+# Columns of HPS plants checked by the row rules of the full analysis
+CPlantsRow = collections.namedtuple('CPlantsRow', ['name', 'imageNumber', 'RHSNumber', 'extraInformation', 'dateWithdrawn'])
+
 class CHPS:
+    # Columns read from HPS plants: Plant name, Number, RHS no, Donor,
+    # Date added, Extra information, Date withdrawn
+    PLANTS_COLUMNS = [1, 2, 3, 8, 9, 11, 12]
+    # Columns read from the RHS dataset: NAME_NUM, ACCEPT_FULL, NAME, GENUS,
+    # NAME_HTML
+    RHS_COLUMNS = [1, 2, 3, 7, 42]
+
     def __init__(self, args):
         self.args = args
 
-        self.gitHubDir         = 'H:\\hps_categorise\\'
-        self.baseDir           = 'H:\\HPS_Images\\'
-        self.plantsDir         = self.baseDir + 'Plants\\'
+        self.gitHubDir         = args.gitHubDir
+        self.baseDir           = args.baseDir
+        self.plantsDir         = self.baseDir + 'Plants' + os.sep
+        self.cacheDir          = self.gitHubDir + 'cache' + os.sep
 
     def stats(self, startCount):
         print(f"Analysis")
@@ -27,11 +42,9 @@ class CHPS:
         if self.createRhsReferenceDB() == 0:
             rhsNumbers = set()
             rhsGenera  = set()
-            for index in range(2, self.rhsReferenceDB.workbook['HPS-NAMES May 19'].max_row):
-                rhsNumber = self.rhsReferenceDB.getValue('HPS-NAMES May 19', index, 1)
+            for index, (rhsNumber, rhsGenus) in self.rhsReferenceDB.getRows('HPS-NAMES May 19', [1, 7]): # NAME_NUM, GENUS
                 if rhsNumber:
                     rhsNumbers.add(rhsNumber)
-                rhsGenus  = self.rhsReferenceDB.getValue('HPS-NAMES May 19', index, 7)
                 if rhsGenus:
                     rhsGenera.add(rhsGenus)
             print( "  * Overall in RHS library, there are:")
@@ -43,80 +56,28 @@ class CHPS:
         if self.createHpsPlantsDB():
             return 1
 
-        totalNumImages = 0
-        numPlants = 0
-        numNewImages = 0
-        numNewPlants = 0
-        foundStartCount = False
-        rhsNumbers = set()
-        hpsDonors = set()
-        hpsGenus = set()
-        addedGenus = set()
-        for currentRow in range(2, self.hpsPlantsDB.workbook['Plants'].max_row):
-            # Ignore the withdrawn images
-            RHSNumber = self.hpsPlantsDB.getValue('Plants', currentRow, 3) # RHS no
-            if not RHSNumber: continue
-            if RHSNumber == 'WITHDRAWN': continue
-            dateWithdrawn = self.hpsPlantsDB.getValue('Plants', currentRow, 12) # Date withdrawn
-            if dateWithdrawn: continue
-
-            HPSName   = self.hpsPlantsDB.getValue('Plants', currentRow, 1) # HPS name
-            HPSNumber = self.hpsPlantsDB.getValue('Plants', currentRow, 2) # HPS no
-            donor     = self.hpsPlantsDB.getValue('Plants', currentRow, 8) # Donor
-            genus     = re.search(r'(\S+)', HPSName)
-            if not genus: continue
-
-            totalNumImages += 1
-
-            # Find the point from where we want to start counting
-            if HPSNumber == startCount:
-                foundStartCount = True
-
-            # Continue if we haven't found the start yet
-            if not foundStartCount:
-                rhsNumbers.add(RHSNumber)
-                hpsGenus.add(genus.group(1))
-                continue
-
-            # Find number of totally new plants added since start count
-            if RHSNumber not in rhsNumbers:
-                numNewPlants += 1
-
-            # Find the donors since start count
-            if donor != 'Anonymous' and donor != 'Unknown':
-                hpsDonors.add(donor)
-
-            # Add the genus
-            if genus.group(1) not in hpsGenus:
-                addedGenus.add(genus.group(1))
+        # Work out all stats in one pass over the columns
+        # Plant name, Number, RHS no, Donor, Date added, Date withdrawn
+        libraryStats = CLibraryStats(startCount)
+        libraryStats.compute(*self.hpsPlantsDB.getColumns('Plants', [1, 2, 3, 8, 9, 12]))
 
-            hpsGenus.add(genus.group(1))
-            rhsNumbers.add(RHSNumber)
-            numNewImages +=1
-
-        print()
-        print( "  * Overall in HPS library, there are:")
-        print(f"    - {len(hpsGenus)} different genus")
-        print(f"    - {len(rhsNumbers)} different species")
-        print(f"    - {totalNumImages} valid images")
-        print()
-        print(f"  * Since {startCount}:")
-        print(f"    - {numNewPlants}/{numNewPlants/(totalNumImages-numNewPlants)*100.0:.1f}% new taxa have been added not previously in library")
-        print(f"    - {len(hpsDonors)} donors contributed")
-        if len(addedGenus):
-            print(f"    - {len(addedGenus)}/{len(addedGenus)/(len(hpsGenus)-len(addedGenus))*100.0:.1f}% new genera have been added not previously in library: {addedGenus}")
-        else:
-            print("    - 0 new genus have been added not previously in library")
-        print(f"    - {numNewImages}/{numNewImages/(totalNumImages-numNewImages)*100.0:.1f}% images have been added")
-        return 0
+        ret = 0
+        if self.args.statsJson and libraryStats.saveJson(self.args.statsJson):
+            ret = 1
+        if self.args.statsCsv and libraryStats.saveCsv(self.args.statsCsv):
+            ret = 1
+        libraryStats.printSummary()
+        return ret
 
     def fullAnalysis(self):
         print("Analyse directories")
         print("-------------------")
+        if self.createPlantsInventory():
+            return 1
         print("- Check file in correct directory")
         allCorrect = True
-        for plantsLetterDir in os.listdir(self.plantsDir):
-            for filename in os.listdir(self.plantsDir+plantsLetterDir):
+        for plantsLetterDir, filenames in self.plantsDirFiles.items():
+            for filename in filenames:
                 if filename.startswith("x "):
                     if filename[2] != plantsLetterDir:
                         allCorrect = False
@@ -144,121 +105,26 @@ class CHPS:
         if self.hpsPlantsDB.validate('Plants', expectedHeaders):
             return 1
 
-        # Check if plant name is filled in for each row
-        print("    - Check each row for missing plant name")
-        missingNameRows = []
-        for currentRow in range(2, self.hpsPlantsDB.workbook['Plants'].max_row):
-            name = self.hpsPlantsDB.getValue('Plants', currentRow, 1) # Plant name
-            if not name:
-                missingNameRows.append(currentRow)
-        if len(missingNameRows):
-            print(f"        ! Warning ! '{self.hpsPlantsDB.filename}' has {len(missingNameRows)} rows with missing plant names: {missingNameRows}")
-        else:
-            print("        No rows have missing plant names")
-
-        # Check if image number is filled in
-        print(f"    - Check each row for missing image numbers")
-        missingImageNumberRows = []
-        for currentRow in range(2, self.hpsPlantsDB.workbook['Plants'].max_row):
-            imageNumber = self.hpsPlantsDB.getValue('Plants', currentRow, 2) # Number
-            if not imageNumber:
-                missingImageNumberRows.append(currentRow)
-        if len(missingImageNumberRows):
-            print(f"        ! Warning! '{self.hpsPlantsDB.filename}' has {len(missingImageNumberRows)} rows with missing image numbers: {missingImageNumbersRows}")
-        else:
-            print("        No rows have missing image numbers")
-
-        # Check if image number is valid
-        print("    - Check each row for valid HPS image numbers")
-        invalidImageNumberRows = []
-        for currentRow in range(2, self.hpsPlantsDB.workbook['Plants'].max_row):
-            imageNumber = self.hpsPlantsDB.getValue('Plants', currentRow, 2) # Number
-            if not imageNumber: continue
-            elif not re.search(r'^(P|X)\d{5}$', imageNumber):
-                invalidImageNumberRows.append(currentRow)
-        if len(invalidImageNumberRows):
-            print(f"        ! Warning ! '{self.hpsPlantsDB.filename}' has {len(invalidImageNumberRows)} rows with invalid image numbers: {invalidImageNumberRows}")
-        else:
-            print("        All rows have valid image numbers")
-
-        # Check if RHS number is filled in and if not that there's at least
-        # information as to why not
-        print("    - Check each row with missing RHS numbers for given reason")
-        missingRHSNumberRows = []
-        for currentRow in range(2, self.hpsPlantsDB.workbook['Plants'].max_row):
-            RHSNumber = self.hpsPlantsDB.getValue('Plants', currentRow, 3) # RHS no
-            if not RHSNumber:
-                extraInformation = self.hpsPlantsDB.getValue('Plants', currentRow, 11) # Extra information
-                if not extraInformation:
-                    missingRHSNumberRows.append(currentRow)
-        if len(missingRHSNumberRows):
-            print(f"        ! Warning ! {len(missingRHSNumberRows)} rows have missing RHS numbers without reason given: {missingRHSNumberRows}")
-        else:
-            print("        All rows with missing RHS numbers have a reason")
-
-        # Check if rhs number is set to withdrawn and has a withdrawn date
-        print("    - Check if withdrawn notifications are valid")
-        mismatchWithdrawnRows = []
-        for currentRow in range(2, self.hpsPlantsDB.workbook['Plants'].max_row):
-            if currentRow in missingRHSNumberRows: continue
-            RHSNumber = self.hpsPlantsDB.getValue('Plants', currentRow, 3) # RHS no
-            dateWithdrawn = self.hpsPlantsDB.getValue('Plants', currentRow, 12) # Date withdrawn
-            if RHSNumber != 'WITHDRAWN' and dateWithdrawn:
-                mismatchWithdrawnRows.append(currentRow)
-            if RHSNumber == 'WITHDRAWN' and not dateWithdrawn:
-                mismatchWithdrawnRows.append(currentRow)
-        if len(mismatchWithdrawnRows):
-            print(f"        ! Warning ! HPS plants has {len(mismatchWithdrawnRows)} rows with mismatching withdrawn notifications: {mismatchWithdrawnRows}")
-        else:
-            print("        All withdrawn notifications are valid")
-
-        # Check withdrawn files don't exists
-        print("    - Make sure withdrawn image files have been removed")
-        firstMissing = True
-        for currentRow in range(2, self.hpsPlantsDB.workbook['Plants'].max_row):
-            RHSNumber = self.hpsPlantsDB.getValue('Plants', currentRow, 3) # RHS no
-            if not RHSNumber: continue
-            name = self.hpsPlantsDB.getValue('Plants', currentRow, 1) # Plant name
-            if not name: continue
-            imageNumber = self.hpsPlantsDB.getValue('Plants', currentRow, 2) # Number
-            if not imageNumber: continue
-            dateWithdrawn = self.hpsPlantsDB.getValue('Plants', currentRow, 12) # Date withdrawn
-            if RHSNumber == 'WITHDRAWN' or dateWithdrawn:
-                fileName = self.plantsDir + name[0] + "\\" + name.replace('/','_') + " " + imageNumber + ".jpg"
-                if os.path.isfile(fileName):
-                    if firstMissing:
-                        firstMissing=False
-                    print(f"        Found withdrawn file '{fileName}'")
-        if firstMissing:
-            print("        All withdrawn image files have been removed")
-
-        # Check if file exists
-        print("    - Check if all valid image files exist")
-        missingFileRows = []
-        firstMissing = True
-        for currentRow in range(2, self.hpsPlantsDB.workbook['Plants'].max_row):
-            RHSNumber = self.hpsPlantsDB.getValue('Plants', currentRow, 3) # RHS no
-            if not RHSNumber: continue
-            name = self.hpsPlantsDB.getValue('Plants', currentRow, 1) # Plant name
-            if not name: continue
-            imageNumber = self.hpsPlantsDB.getValue('Plants', currentRow, 2) # Number
-            if not imageNumber: continue
-            dateWithdrawn = self.hpsPlantsDB.getValue('Plants', currentRow, 12) # Date withdrawn
-            if RHSNumber == 'WITHDRAWN' or dateWithdrawn:
-                continue
-            fileName = self.plantsDir
-            if name.startswith("x "):
-                fileName += name[2]
-            else:
-                fileName += name[0]
-            fileName += "\\" + name.replace('/','_') + " " + imageNumber + ".jpg"
-            if not os.path.isfile(fileName):
-                if firstMissing:
-                    firstMissing = False
-                print(f"        Can't find '{fileName}'")
-                missingFileRows.append(currentRow)
-        if len(missingFileRows) == 0:
-            print("        All valid image files exist")
+        # Check all rows in one pass, each rule keeps the rows it reports on.
+        # Plant name, Number, RHS no, Extra information, Date withdrawn
+        rules = [CRowRule("    - Check each row for missing plant name",
+                          self.checkMissingName, self.reportMissingName),
+                 CRowRule("    - Check each row for missing image numbers",
+                          self.checkMissingImageNumber, self.reportMissingImageNumber),
+                 CRowRule("    - Check each row for valid HPS image numbers",
+                          self.checkInvalidImageNumber, self.reportInvalidImageNumber),
+                 CRowRule("    - Check each row with missing RHS numbers for given reason",
+                          self.checkMissingRHSNumber, self.reportMissingRHSNumber),
+                 CRowRule("    - Check if withdrawn notifications are valid",
+                          self.checkMismatchWithdrawn, self.reportMismatchWithdrawn),
+                 CRowRule("    - Make sure withdrawn image files have been removed",
+                          self.checkWithdrawnFile, self.reportWithdrawnFile),
+                 CRowRule("    - Check if all valid image files exist",
+                          self.checkMissingFile, self.reportMissingFile),
+                 CRowRule(f"    - Check if all image files have a row in '{self.hpsPlantsDB.filename}'",
+                          self.checkPlantFile, self.reportOrphanFiles)]
+        rows = ((currentRow, CPlantsRow(*row)) for currentRow, row in self.hpsPlantsDB.getRows('Plants', [1, 2, 3, 11, 12]))
+        applyRowRules(rules, rows)
         print()
 
         # Validate RHS dataset
@@ -294,6 +160,10 @@ class CHPS:
         hpsNames   = self.hpsPlantsDB.getColumn('Plants', 1) # Plant name
         rhsNumbers = self.rhsReferenceDB.getColumn('HPS-NAMES May 19', 1) # NAME_NUM
         rhsNames   = self.rhsReferenceDB.getColumn('HPS-NAMES May 19', 3) # NAME
+        # First row of each RHS number
+        rhsRowByNumber = {}
+        for rhsIndex, rhsNumber in enumerate(rhsNumbers):
+            rhsRowByNumber.setdefault(rhsNumber, rhsIndex)
         for hpsIndex in range(1, len(numbers)):
             imageNumbers = numbers[hpsIndex]
             if not imageNumbers:
@@ -304,15 +174,15 @@ class CHPS:
                 numberList = [ str(imageNumbers) ]
             for imageNumber in numberList:
                 if imageNumber and imageNumber.isnumeric():
-                    if int(imageNumber) not in rhsNumbers:
+                    rhsIndex = rhsRowByNumber.get(int(imageNumber))
+                    if rhsIndex is None:
                         #print(f"  RHS number '{imageNumber}' doesn't exist in RHS list")
                         wrongNumbers.append(hpsIndex+1)
                     else:
-                        rhsIndex = rhsNumbers.index(int(imageNumber))
                         rhsName = rhsNames[rhsIndex]
                         rhsName = re.sub('\s*AGM', '', rhsName)
                         rhsName = re.sub('\s*\(PBR\)', '', rhsName)
-                        if rhsName not in hpsNames[hpsIndex]:
+                        if not hpsNames[hpsIndex] or rhsName not in hpsNames[hpsIndex]:
                             wrongNames.append(hpsIndex+1)
                             #print('{}: "{}", "{}"'.format(hpsIndex, rhsName, hpsNames[hpsIndex]))
         if len(wrongNumbers):
@@ -331,17 +201,14 @@ class CHPS:
         print()
 
         print(f"  - Cross reference if withdrawn images in '{self.hpsPlantsDB.filename}' aren't in '{self.imagelibDB.filename}'")
-        imagelibIDs = self.imagelibDB.getColumn('active', 2) # Image ID
+        imagelibIDs = set(self.imagelibDB.getColumn('active', 2)) # Image ID
         extraNumbers = []
-        for currentRow in range(2, self.hpsPlantsDB.workbook['Plants'].max_row):
-            imageNumber = self.hpsPlantsDB.getValue('Plants', currentRow, 2) # Number
+        for currentRow, (imageNumber, RHSNumber, dateWithdrawn) in self.hpsPlantsDB.getRows('Plants', [2, 3, 12]): # Number, RHS no, Date withdrawn
             if not imageNumber: continue
             # Make sure no withdrawn numbers are in imagelib
-            RHSNumber = self.hpsPlantsDB.getValue('Plants', currentRow, 3) # RHS no
             if RHSNumber == 'WITHDRAWN' and imageNumber in imagelibIDs:
                 extraNumbers.append(currentRow)
                 continue
-            dateWithdrawn = self.hpsPlantsDB.getValue('Plants', currentRow, 12) # Date withdrawn
             if dateWithdrawn and imageNumber in imagelibIDs:
                 extraNumbers.append(currentRow)
                 continue
@@ -352,28 +219,167 @@ class CHPS:
         print()
 
         print(f"  - Cross reference if HTML plant names in '{self.imagelibDB.filename}' match up with plant names in '{self.rhsReferenceDB.filename}'")
-        for currentRow in range(2, self.imagelibDB.workbook['active'].max_row):
-            imagelibName = self.imagelibDB.getValue('active', currentRow, 1) # Caption
-            imagelibNumber = self.imagelibDB.getValue('active', currentRow, 2) # Image ID
-            foundName = False
-            # Find image number in HPS images
-            for plantindex in range(2, self.hpsPlantsDB.workbook['Plants'].max_row):
-                hpsPlantsNumber = self.hpsPlantsDB.getValue('Plants', plantindex, 2) # HPS Number
-                if hpsPlantsNumber == imagelibNumber:
-                    # Find RHS number in HPS images
-                    hpsPlantsRHSNumber = self.hpsPlantsDB.getValue('Plants', plantindex, 3) # RHS Number
-                    # Find RHS name in RHS database
-                    for rhsindex in range(2, self.rhsReferenceDB.workbook['HPS-NAMES May 19'].max_row):
-                        rhsNumber = self.rhsReferenceDB.getValue('HPS-NAMES May 19', rhsindex, 1)
-                        if rhsNumber == hpsPlantsRHSNumber:
-                            foundName = True
-                            rhsHTMLName = "<span RHS>" + self.rhsReferenceDB.getValue('HPS-NAMES May 19', rhsindex, 42) + "</span>"
-                            if rhsHTMLName != imagelibName:
-                                print(f"      Names don't correspond for HPS image ID {imagelibNumber}, RHS number {rhsNumber}:")
-                                print(f"          RHS name: {rhsHTMLName}")
-                                print(f"          HPS name: {imagelibName}")
-                        if foundName: break
-                if foundName: break
+        # Look up the RHS numbers of each HPS number and the HTML name of each
+        # RHS number instead of scanning both sheets for every imagelib row
+        hpsRHSNumbers = {}
+        for plantindex, (hpsPlantsNumber, hpsPlantsRHSNumber) in self.hpsPlantsDB.getRows('Plants', [2, 3]): # HPS Number, RHS Number
+            hpsRHSNumbers.setdefault(hpsPlantsNumber, []).append(hpsPlantsRHSNumber)
+        rhsHTMLNames = {}
+        for rhsindex, (rhsNumber, rhsHTMLName) in self.rhsReferenceDB.getRows('HPS-NAMES May 19', [1, 42]): # NAME_NUM, NAME_HTML
+            rhsHTMLNames.setdefault(rhsNumber, rhsHTMLName)
+        for currentRow, (imagelibName, imagelibNumber) in self.imagelibDB.getRows('active', [1, 2]): # Caption, Image ID
+            # Use the first HPS row with this image number which has a known
+            # RHS number
+            for rhsNumber in hpsRHSNumbers.get(imagelibNumber, []):
+                if rhsNumber in rhsHTMLNames:
+                    rhsHTMLName = "<span RHS>" + rhsHTMLNames[rhsNumber] + "</span>"
+                    if rhsHTMLName != imagelibName:
+                        print(f"      Names don't correspond for HPS image ID {imagelibNumber}, RHS number {rhsNumber}:")
+                        print(f"          RHS name: {rhsHTMLName}")
+                        print(f"          HPS name: {imagelibName}")
+                    break
+
+    # Rules for the rows of HPS plants, see fullAnalysis()
+    def checkMissingName(self, currentRow, row):
+        if not row.name:
+            return currentRow
+
+    def reportMissingName(self, missingNameRows):
+        if len(missingNameRows):
+            print(f"        ! Warning ! '{self.hpsPlantsDB.filename}' has {len(missingNameRows)} rows with missing plant names: {missingNameRows}")
+        else:
+            print("        No rows have missing plant names")
+
+    def checkMissingImageNumber(self, currentRow, row):
+        if not row.imageNumber:
+            return currentRow
+
+    def reportMissingImageNumber(self, missingImageNumberRows):
+        if len(missingImageNumberRows):
+            print(f"        ! Warning! '{self.hpsPlantsDB.filename}' has {len(missingImageNumberRows)} rows with missing image numbers: {missingImageNumberRows}")
+        else:
+            print("        No rows have missing image numbers")
+
+    def checkInvalidImageNumber(self, currentRow, row):
+        if row.imageNumber and not re.search(r'^(P|X)\d{5}$', row.imageNumber):
+            return currentRow
+
+    def reportInvalidImageNumber(self, invalidImageNumberRows):
+        if len(invalidImageNumberRows):
+            print(f"        ! Warning ! '{self.hpsPlantsDB.filename}' has {len(invalidImageNumberRows)} rows with invalid image numbers: {invalidImageNumberRows}")
+        else:
+            print("        All rows have valid image numbers")
+
+    def isMissingRHSNumber(self, row):
+        # RHS number isn't filled in and there's no information as to why not
+        return not row.RHSNumber and not row.extraInformation
+
+    def checkMissingRHSNumber(self, currentRow, row):
+        if self.isMissingRHSNumber(row):
+            return currentRow
+
+    def reportMissingRHSNumber(self, missingRHSNumberRows):
+        if len(missingRHSNumberRows):
+            print(f"        ! Warning ! {len(missingRHSNumberRows)} rows have missing RHS numbers without reason given: {missingRHSNumberRows}")
+        else:
+            print("        All rows with missing RHS numbers have a reason")
+
+    def checkMismatchWithdrawn(self, currentRow, row):
+        # Rows with a missing RHS number are already reported
+        if self.isMissingRHSNumber(row):
+            return None
+        if (row.RHSNumber == 'WITHDRAWN') != bool(row.dateWithdrawn):
+            return currentRow
+
+    def reportMismatchWithdrawn(self, mismatchWithdrawnRows):
+        if len(mismatchWithdrawnRows):
+            print(f"        ! Warning ! HPS plants has {len(mismatchWithdrawnRows)} rows with mismatching withdrawn notifications: {mismatchWithdrawnRows}")
+        else:
+            print("        All withdrawn notifications are valid")
+
+    def checkWithdrawnFile(self, currentRow, row):
+        if not row.RHSNumber or not row.name or not row.imageNumber:
+            return None
+        if row.RHSNumber == 'WITHDRAWN' or row.dateWithdrawn:
+            fileName = self.plantsDir + row.name[0] + os.sep + row.name.replace('/','_') + " " + row.imageNumber + ".jpg"
+            if self.isPlantFile(fileName):
+                return fileName
+
+    def reportWithdrawnFile(self, withdrawnFiles):
+        for fileName in withdrawnFiles:
+            print(f"        Found withdrawn file '{fileName}'")
+        if len(withdrawnFiles) == 0:
+            print("        All withdrawn image files have been removed")
+
+    def checkMissingFile(self, currentRow, row):
+        if not row.RHSNumber or not row.name or not row.imageNumber:
+            return None
+        if row.RHSNumber == 'WITHDRAWN' or row.dateWithdrawn:
+            return None
+        fileName = self.getPlantFileName(row)
+        if not self.isPlantFile(fileName):
+            return fileName
+
+    def reportMissingFile(self, missingFiles):
+        for fileName in missingFiles:
+            print(f"        Can't find '{fileName}'")
+        if len(missingFiles) == 0:
+            print("        All valid image files exist")
+
+    def checkPlantFile(self, currentRow, row):
+        # File the row accounts for, withdrawn files are looked for where
+        # checkWithdrawnFile() does
+        if not row.name or not row.imageNumber:
+            return None
+        if row.RHSNumber == 'WITHDRAWN' or row.dateWithdrawn:
+            return os.path.normcase(self.plantsDir + row.name[0] + os.sep + row.name.replace('/','_') + " " + row.imageNumber + ".jpg")
+        return os.path.normcase(self.getPlantFileName(row))
+
+    def reportOrphanFiles(self, plantFiles):
+        plantFiles = set(plantFiles)
+        orphanFiles = []
+        for plantsLetterDir, filenames in self.plantsDirFiles.items():
+            for filename in filenames:
+                if not filename.lower().endswith(".jpg"):
+                    continue
+                fileName = self.plantsDir + plantsLetterDir + os.sep + filename
+                if os.path.normcase(fileName) not in plantFiles:
+                    orphanFiles.append(fileName)
+        for fileName in orphanFiles:
+            print(f"        No row for '{fileName}'")
+        if len(orphanFiles) == 0:
+            print("        All image files have a row")
+
+    def getPlantFileName(self, row):
+        # Hybrid genera starting with 'x ' are filed under the next letter
+        fileName = self.plantsDir
+        if row.name.startswith("x "):
+            fileName += row.name[2]
+        else:
+            fileName += row.name[0]
+        return fileName + os.sep + row.name.replace('/','_') + " " + row.imageNumber + ".jpg"
+
+    def isPlantFile(self, fileName):
+        # Same as os.path.isfile() for files in the plants directory, but
+        # without going to the disk
+        return os.path.normcase(fileName) in self.plantsFiles
+
+    def createPlantsInventory(self):
+        # List every letter directory once, the plants directory can be on
+        # a network drive where each file system call is slow
+        catalogue = CFileCatalogue()
+        self.plantsDirFiles = {}
+        self.plantsFiles = set()
+        try:
+            for plantsLetterDir in catalogue.listDirectories(self.plantsDir):
+                filenames = catalogue.listFiles(self.plantsDir + plantsLetterDir)
+                self.plantsDirFiles[plantsLetterDir] = filenames
+                for filename in filenames:
+                    self.plantsFiles.add(os.path.normcase(self.plantsDir + plantsLetterDir + os.sep + filename))
+        except OSError as e:
+            print(f"! Couldn't list '{self.plantsDir}': {e}")
+            return 1
+        return 0
 
     def createImagelibDB(self):
         # imagelib.csv can be found in docsftp@hardy-plant.org.uk:/plants
@@ -383,7 +389,7 @@ class CHPS:
             print("doesn't exist!")
             return 1
 
-        self.imagelibDB = CSpreadSheet(fileName)
+        self.imagelibDB = CSpreadSheet(fileName, snapshotDir=self.cacheDir)
         print("OK")
 
         return 0
@@ -406,7 +412,7 @@ class CHPS:
                 return 1
 
         print(f"  - {fileName}: importing  ", end="\r")
-        self.hpsPlantsDB = CSpreadSheet(fileName)
+        self.hpsPlantsDB = CSpreadSheet(fileName, True, self.PLANTS_COLUMNS, self.cacheDir)
         print(f"  - {fileName}: OK         ")
 
         return 0
@@ -429,7 +435,7 @@ class CHPS:
                 return 1
 
         print(f"  - {fileName}: importing  ", end="\r")
-        self.rhsReferenceDB = CSpreadSheet(fileName)
+        self.rhsReferenceDB = CSpreadSheet(fileName, True, self.RHS_COLUMNS, self.cacheDir)
         print(f"  - {fileName}: OK         ")
 
         return 0
@@ -439,8 +445,25 @@ class CHPS:
 def main():
     # Process the arguments
     parser = argparse.ArgumentParser(
-        description='Stats on images.',
+        description='Stats on images.')
 
+    parser.add_argument(
+        '--gitHubDir',
+        default='H:\\hps_categorise\\',
+        type=lambda value: os.path.join(value, ''),
+        help='Directory with the spreadsheets, a path separator is added at the end if missing (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--baseDir',
+        default='H:\\HPS_Images\\',
+        type=lambda value: os.path.join(value, ''),
+        help='Directory with the plant images, a path separator is added at the end if missing (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--download',
+        action='store_true',
+        help='Download the latest version of the databases first'
+    )
     parser.add_argument(
         '--fullAnalysis',
         action='store_true',
@@ -450,6 +473,14 @@ def main():
         '--stats',
         help='Print out stats of database since given HPS number (e.g. P00001)'
     )
+    parser.add_argument(
+        '--statsJson',
+        help='Also write the stats as JSON to the given file'
+    )
+    parser.add_argument(
+        '--statsCsv',
+        help='Also write the stats as CSV to the given file'
+    )
     args = parser.parse_args()
 
     # Construct the base class
@@ -462,8 +493,7 @@ def main():
         if not re.search(r'P\d{5}', args.stats):
             print("Invalid start number");
             return 1
-        hps.stats(args.stats)
-        return 0
+        return hps.stats(args.stats)
 
     # Do a full analysis of the databases
     if args.fullAnalysis:
@@ -473,5 +503,3 @@ def main():
 if __name__ == "__main__":
     ret = main()
     sys.exit(ret)
-
-sys.exit(1)
\ No newline at end of file